@@ -8,7 +8,12 @@ import json
 from flask import Blueprint, abort, current_app, jsonify, request
 
 import asyncev
-from asyncev import run_async
+from asyncev import (
+    run_async,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_USER_VISIBLE,
+)
 import exc
 from home import handle_home
 from otterbot import talk_to_me
@@ -19,13 +24,21 @@ from report import (
     handle_report_submit_modal,
     handle_report_submit_validation,
 )
-from slack_api import get_file_info, get_bot_user_id, post
+from slack_api import get_file_info, get_bot_user_id, post, post_raw
 import utils
 
 api = Blueprint("api", __name__, url_prefix="/")
 logger = logging.getLogger("api")
 
 
+def _request_ts():
+    # When slack sent this request - which is about when any trigger_id was minted.
+    try:
+        return float(request.headers["X-Slack-Request-Timestamp"])
+    except (KeyError, ValueError):
+        return None
+
+
 @api.route("/report", methods=["GET", "POST"])
 def top():
     # This handles the /report command
@@ -55,10 +68,20 @@ def submit():
         verrors = handle_report_submit_validation(rjson)
         if verrors:
             return jsonify(verrors), 200
-        run_async(current_app.config["EV_MODE"], handle_report_submit_modal, rjson)
+        run_async(
+            current_app.config["EV_MODE"],
+            handle_report_submit_modal,
+            rjson,
+            priority=PRIORITY_USER_VISIBLE,
+        )
         return "", 200
     elif rjson["type"] == "view_closed":
-        run_async(current_app.config["EV_MODE"], handle_report_cancel_modal, rjson)
+        run_async(
+            current_app.config["EV_MODE"],
+            handle_report_cancel_modal,
+            rjson,
+            priority=PRIORITY_BACKGROUND,
+        )
         return "", 200
 
     elif rjson["type"] == "block_actions":
@@ -82,10 +105,19 @@ def submit():
                 value,
                 rjson["trigger_id"],
                 state,
+                priority=PRIORITY_INTERACTIVE,
+                origin_ts=_request_ts(),
             )
         elif block_type == "HOMEAT":
             value = rjson["actions"][0]["value"]
-            run_async(current_app.config["EV_MODE"], handle_at, value, rjson)
+            run_async(
+                current_app.config["EV_MODE"],
+                handle_at,
+                value,
+                rjson,
+                priority=PRIORITY_INTERACTIVE,
+                origin_ts=_request_ts(),
+            )
         else:
             logger.error(f"Unknown block actions block id {block_id}")
         return "", 200
@@ -123,13 +155,29 @@ def events():
 
         if event["type"] == "app_mention":
             # let's chat
-            run_async(current_app.config["EV_MODE"], talk_to_me, event_id, event)
+            run_async(
+                current_app.config["EV_MODE"],
+                talk_to_me,
+                event_id,
+                event,
+                priority=PRIORITY_USER_VISIBLE,
+            )
         elif event["type"] == "file_created" or event["type"] == "file_shared":
-            run_async(current_app.config["EV_MODE"], handle_file, event)
+            run_async(
+                current_app.config["EV_MODE"],
+                handle_file,
+                event,
+                priority=PRIORITY_BACKGROUND,
+            )
         elif event["type"] == "app_home_opened":
             # Alas mobile app doesn't work yet
             if event.get("tab", None) == "home":
-                run_async(current_app.config["EV_MODE"], handle_home, event)
+                run_async(
+                    current_app.config["EV_MODE"],
+                    handle_home,
+                    event,
+                    priority=PRIORITY_USER_VISIBLE,
+                )
         elif event["type"] == "message":
             subtype = event.get("subtype", "")
             if subtype and subtype != "file_share":
@@ -141,7 +189,13 @@ def events():
                 # Treat like a mention - seems like this can only be DMs.
                 # hack - make it look same as a @mention.
                 event["text"] = "DM " + event["text"]
-                run_async(current_app.config["EV_MODE"], talk_to_me, event_id, event)
+                run_async(
+                    current_app.config["EV_MODE"],
+                    talk_to_me,
+                    event_id,
+                    event,
+                    priority=PRIORITY_USER_VISIBLE,
+                )
         else:
             logger.info("Ignored Event type: {}".format(event["type"]))
 
@@ -187,7 +241,19 @@ def handle_at(when, rjson):
 
         lday, ckey = utils.at_cache_helper(which_day, where)
         logger.info(f"APP: handle_at Pacific TZ: {lday.isoformat()} Key: {ckey}")
-        atinfo = app.ddb_cache.get(ckey)
+        # One round trip for both - the rendered copy is normally there.
+        cached = app.ddb_cache.get_many([utils.render_ckey(ckey), ckey])
+        rendered = utils.current_render(cached[utils.render_ckey(ckey)])
+        if rendered:
+            body = utils.splice_json(
+                "{}",
+                trigger_id=rjson["trigger_id"],
+                view=utils.RawJSON(rendered["view"]),
+            )
+            _open_view(post_raw, body)
+            return {}
+
+        atinfo = cached[ckey]
         if not atinfo:
             logger.warning(f"No atinfo for ckey: {ckey}")
             view = {
@@ -234,19 +300,18 @@ def handle_at(when, rjson):
                     },
                 },
             ]
-            view = {
-                "type": "modal",
-                "title": {"type": "plain_text", "text": "Who's at the Reserve"},
-                "notify_on_close": False,
-                "blocks": blocks,
-            }
+            view = utils.at_view(blocks)
 
-        try:
-            post("views.open", dict(trigger_id=rjson["trigger_id"], view=view))
-        except exc.SlackApiError as ex:
-            if "expired_trigger_id" in repr(ex):
-                logger.warning("Received trigger expired - ignoring")
-            else:
-                raise
+        _open_view(post, dict(trigger_id=rjson["trigger_id"], view=view))
 
     return {}
+
+
+def _open_view(poster, payload):
+    try:
+        poster("views.open", payload)
+    except exc.SlackApiError as ex:
+        if "expired_trigger_id" in repr(ex):
+            logger.warning("Received trigger expired - ignoring")
+        else:
+            raise
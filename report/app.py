@@ -36,9 +36,11 @@ import asyncev
 from constants import LOG_FORMAT, DATE_FMT
 from drupal_api import DrupalApi
 from dynamo import DDB, DDBCache
+import http_cache
 from report_drupal import Report as DrupalReport
 from scheduled_activity import ScheduledActivity
 from slack_api import get_bot_info
+from user_directory import UserDirectory
 
 REQUIRED_CONFIG = ["SIGNING_SECRET", "BOT_TOKEN", "SECRET_KEY"]
 
@@ -83,10 +85,13 @@ def create_app():
         app.config["PLSNR_PASSWORD"],
         "{}/plsnr1933api".format(app.config["PLSNR_HOST"]),
         app.config["SSL_VERIFY"],
+        int(app.config["PLSNR_MAX_WORKERS"]),
+        http_cache.from_config(app.config, app.ddb_cache),
     )
 
-    app.report = DrupalReport(app.config, site)
-    app.sa = ScheduledActivity(app.config, site)
+    app.users = UserDirectory(app.config, site, app.ddb_cache)
+    app.report = DrupalReport(app.config, site, app.users, app.ddb_cache)
+    app.sa = ScheduledActivity(app.config, site, app.ddb_cache)
     app.register_blueprint(api)
 
     app.moment = Moment(app)
@@ -102,7 +107,13 @@ if __name__ == "__main__":
     app.ddb.create_all()
     get_bot_info()
 
-    threading.Thread(target=lambda: asyncev.run_loop(asyncev.event_loop)).start()
+    if app.config["EV_MODE"] == "pool":
+        asyncev.start_pool(app.config)
+    else:
+        threading.Thread(target=lambda: asyncev.run_loop(asyncev.event_loop)).start()
 
     app.run(host="localhost", port=6002, debug=True, use_reloader=False)
-    asyncev.event_loop.call_soon_threadsafe(asyncev.event_loop.stop)
+    if asyncev.worker_pool:
+        asyncev.worker_pool.shutdown()
+    else:
+        asyncev.event_loop.call_soon_threadsafe(asyncev.event_loop.stop)
@@ -0,0 +1,61 @@
+# Copyright 2019-2024 by J. Christopher Wagner (jwag). All rights reserved.
+
+"""
+Awaitable counterparts of slack_api.
+
+Each call is handed to the event loop's default executor so it shares the
+pooled keep-alive session (and its connection stats) in slack_api while letting
+the loop run many slack calls at the same time.
+"""
+
+import asyncio
+import functools
+
+import slack_api
+
+
+async def _run(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def post(endpoint, payload, auth=None, timeout=slack_api.DEFAULT_TIMEOUT):
+    return await _run(slack_api.post, endpoint, payload, auth=auth, timeout=timeout)
+
+
+async def post_raw(endpoint, body, auth=None, timeout=slack_api.DEFAULT_TIMEOUT):
+    return await _run(slack_api.post_raw, endpoint, body, auth=auth, timeout=timeout)
+
+
+async def get(endpoint, params=None, timeout=slack_api.DEFAULT_TIMEOUT):
+    return await _run(slack_api.get, endpoint, params=params, timeout=timeout)
+
+
+async def get_file_info(fid, timeout=slack_api.DEFAULT_TIMEOUT):
+    return await _run(slack_api.get_file_info, fid, timeout=timeout)
+
+
+async def post_ephemeral_message(channel, user, payload):
+    return await _run(slack_api.post_ephemeral_message, channel, user, payload)
+
+
+async def post_message(channel, payload):
+    return await _run(slack_api.post_message, channel, payload)
+
+
+async def delete_message(channel, ts):
+    return await _run(slack_api.delete_message, channel, ts)
+
+
+async def get_all_users():
+    users = []
+
+    rv = await get("users.list", {"limit": 50})
+    users.extend(rv["members"])
+
+    next_batch = rv["response_metadata"].get("next_cursor", None)
+    while next_batch:
+        rv = await get("users.list", {"limit": 50, "cursor": next_batch})
+        users.extend(rv["members"])
+        next_batch = rv["response_metadata"].get("next_cursor", None)
+    return users
@@ -3,17 +3,42 @@
 """
 Async handler.
 
-There are 2 models - event_loop (local) and zappa (AWS).
+There are 3 models - event_loop (local), pool (local) and zappa (AWS).
+
+"ev" runs everything on a single event loop thread - so one slow handler
+delays all the others. "pool" hands work to a bounded set of worker threads.
+
+Tasks have a priority class - interactive (must use a trigger_id before it
+expires), user_visible and background. The pool runs higher classes first but
+a task is bumped up a class for every max_wait seconds it has been waiting.
+
+Handlers are plain (blocking) functions so they can be run by zappa. Within a
+handler, independent slack calls (see aslack_api) can be run concurrently
+with run_concurrently().
 """
 
+from collections import deque
 import logging
+import threading
+import time
 
 import asyncio
 
 event_loop = asyncio.new_event_loop()
+worker_pool = None
 
 wapp = None
 
+REJECT_POLICIES = ["reject", "caller_runs", "block"]
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_USER_VISIBLE = 1
+PRIORITY_BACKGROUND = 2
+PRIORITIES = [PRIORITY_INTERACTIVE, PRIORITY_USER_VISIBLE, PRIORITY_BACKGROUND]
+
+# Slack trigger_ids are good for 3 seconds.
+TRIGGER_WINDOW = 3.0
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,10 +48,270 @@ def run_loop(loop):
     loop.run_forever()
 
 
-def run_async(mode, func, *args, **kwargs):
-    if mode == "ev":
-        event_loop.call_soon_threadsafe(func, *args)
+class WorkerPool:
+    """
+    A fixed number of worker threads fed from a bounded queue.
+
+    When the queue is full the reject_policy decides what happens:
+        reject - drop the task (and log it)
+        caller_runs - run the task in the submitting thread
+        block - wait up to block_timeout seconds for room, then reject
+    """
+
+    def __init__(
+        self,
+        workers=4,
+        queue_size=32,
+        reject_policy="reject",
+        block_timeout=1.0,
+        max_wait=2.0,
+    ):
+        if reject_policy not in REJECT_POLICIES:
+            raise ValueError(f"Unknown reject policy {reject_policy}")
+        self._nworkers = workers
+        self._queue_size = queue_size
+        self._reject_policy = reject_policy
+        self._block_timeout = block_timeout
+        self._max_wait = max_wait
+        self._queues = {p: deque() for p in PRIORITIES}
+        self._depth = 0
+        self._cv = threading.Condition()
+        self._threads = []
+        self._running = False
+
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_last = 0.0
+        self._wait_max = 0.0
+        self._wait_total = 0.0
+        self._promoted = 0
+        self._trigger_age_last = 0.0
+        self._trigger_age_max = 0.0
+
+    def start(self):
+        self._running = True
+        for i in range(self._nworkers):
+            t = threading.Thread(target=self._worker, name=f"ev-pool-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def shutdown(self, wait=True):
+        with self._cv:
+            self._running = False
+            self._cv.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+        self._threads = []
+
+    def submit(
+        self, func, *args, priority=PRIORITY_USER_VISIBLE, origin_ts=None, **kwargs
+    ):
+        """
+        Queue func - returns False if the task was rejected.
+        origin_ts is the (epoch) time slack sent the request - used to track
+        how old the trigger is when the task actually starts.
+        """
+        task = (time.monotonic(), priority, origin_ts, func, args, kwargs)
+        with self._cv:
+            if self._depth >= self._queue_size:
+                if self._reject_policy == "block":
+                    self._cv.wait_for(
+                        lambda: self._depth < self._queue_size,
+                        timeout=self._block_timeout,
+                    )
+                if self._depth >= self._queue_size:
+                    if self._reject_policy != "caller_runs":
+                        self._rejected += 1
+                        logger.error(
+                            f"Worker pool saturated - rejecting {func.__name__}"
+                            f" stats: {self._stats()}"
+                        )
+                        return False
+                    task = None
+            if task:
+                self._submitted += 1
+                self._queues[priority].append(task)
+                self._depth += 1
+                self._cv.notify_all()
+                return True
+        logger.warning(f"Worker pool saturated - running {func.__name__} inline")
+        _trigger_age(func, origin_ts)
+        self._run(func, args, kwargs)
+        return True
+
+    def stats(self):
+        with self._cv:
+            return self._stats()
+
+    def _stats(self):
+        started = self._completed + self._active
+        return {
+            "queue_depth": self._depth,
+            "queue_depth_by_priority": {p: len(q) for p, q in self._queues.items()},
+            "active": self._active,
+            "workers": self._nworkers,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "wait_last": self._wait_last,
+            "wait_max": self._wait_max,
+            "wait_avg": self._wait_total / started if started else 0.0,
+            "promoted": self._promoted,
+            "trigger_age_last": self._trigger_age_last,
+            "trigger_age_max": self._trigger_age_max,
+        }
+
+    def _next_task(self):
+        # Highest priority first - but a waiting task is aged up one class
+        # for every max_wait seconds it sits in the queue so nothing starves.
+        now = time.monotonic()
+        best = None
+        for p in PRIORITIES:
+            q = self._queues[p]
+            if q:
+                effective = p - int((now - q[0][0]) / self._max_wait)
+                if best is None or effective < best[0]:
+                    best = (effective, p)
+        _, p = best
+        if p != next(p for p in PRIORITIES if self._queues[p]):
+            self._promoted += 1
+        self._depth -= 1
+        return self._queues[p].popleft()
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                self._cv.wait_for(lambda: self._depth or not self._running)
+                if not self._running:
+                    return
+                queued, _, origin_ts, func, args, kwargs = self._next_task()
+                wait = time.monotonic() - queued
+                self._active += 1
+                self._wait_last = wait
+                self._wait_max = max(self._wait_max, wait)
+                self._wait_total += wait
+                age = _trigger_age(func, origin_ts)
+                if age is not None:
+                    self._trigger_age_last = age
+                    self._trigger_age_max = max(self._trigger_age_max, age)
+                # wake up any blocked submitters
+                self._cv.notify_all()
+            ok = self._run(func, args, kwargs)
+            with self._cv:
+                self._active -= 1
+                self._completed += 1
+                if not ok:
+                    self._failed += 1
+
+    @staticmethod
+    def _run(func, args, kwargs):
+        try:
+            rv = func(*args, **kwargs)
+            if asyncio.iscoroutine(rv):
+                asyncio.run(rv)
+            return True
+        except Exception:
+            logger.exception(f"Async task {func.__name__} failed")
+            return False
+
+
+def start_pool(config):
+    """Just used in local development (not lambda)"""
+    global worker_pool
+    worker_pool = WorkerPool(
+        workers=int(config.get("EV_POOL_WORKERS", 4)),
+        queue_size=int(config.get("EV_POOL_QUEUE_SIZE", 32)),
+        reject_policy=config.get("EV_POOL_REJECT_POLICY", "reject"),
+        block_timeout=float(config.get("EV_POOL_BLOCK_TIMEOUT", 1.0)),
+        max_wait=float(config.get("EV_POOL_MAX_WAIT", 2.0)),
+    )
+    worker_pool.start()
+    return worker_pool
+
+
+def pool_stats():
+    """Live gauges for the worker pool (None if not in 'pool' mode)."""
+    if not worker_pool:
+        return None
+    return worker_pool.stats()
+
+
+def _trigger_age(func, origin_ts):
+    # How long since slack sent us the request that started this task.
+    if origin_ts is None:
+        return None
+    age = time.time() - origin_ts
+    if age >= TRIGGER_WINDOW:
+        logger.warning(f"Dispatching {func.__name__} trigger age {age:.2f}s - expired")
+    else:
+        logger.info(f"Dispatching {func.__name__} trigger age {age:.2f}s")
+    return age
+
+
+def _run_ev(func, args, kwargs, origin_ts):
+    _trigger_age(func, origin_ts)
+    func(*args, **kwargs)
+
+
+def run_async(
+    mode, func, *args, priority=PRIORITY_USER_VISIBLE, origin_ts=None, **kwargs
+):
+    """
+    Run func asynchronously.
+    priority is only honored in "pool" mode - ev runs tasks in order and zappa
+    runs each in its own lambda.
+    """
+    if mode == "pool":
+        worker_pool.submit(
+            func, *args, priority=priority, origin_ts=origin_ts, **kwargs
+        )
+    elif mode == "ev":
+        if asyncio.iscoroutinefunction(func):
+            _trigger_age(func, origin_ts)
+            asyncio.run_coroutine_threadsafe(func(*args, **kwargs), event_loop)
+        else:
+            event_loop.call_soon_threadsafe(_run_ev, func, args, kwargs, origin_ts)
     else:
         from zappa.asynchronous import run
 
+        _trigger_age(func, origin_ts)
         run(func, args, kwargs)
+
+
+async def _gather(*coros):
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            logger.error(f"Concurrent call failed: {r!r}")
+    return results
+
+
+# Tasks started by run_concurrently that haven't finished yet.
+_pending = set()
+
+
+def run_concurrently(*coros):
+    """
+    Run coroutines concurrently from a (blocking) handler.
+
+    When called from the event loop thread ("ev" mode) we can't block the loop -
+    so the coroutines are scheduled as a task and this returns immediately.
+    Otherwise (zappa) this blocks until all complete and returns their results
+    (exceptions are logged and returned in place of the result).
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop:
+        task = loop.create_task(_gather(*coros))
+        # The loop only keeps a weak reference - keep it until it is done.
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+        return task
+    return asyncio.run(_gather(*coros))
@@ -11,6 +11,13 @@ TYPE_DISTURBANCE = "disturbance"
 CKEY_WILDLIFE_ISSUES = "wissues"
 CKEY_OTHER_ISSUES = "oissues"
 CKEY_PLACES = "placed"
+CKEY_USERS = "users"
+# Per slack user - their website user
+CKEY_IDENTITY = "ident:{}"
+CKEY_ACTIVITY_CONFIG = "aconfig"
+CKEY_DISTURBANCE_VIEW = "dview"
+# Per user - what we last published to their Home tab
+CKEY_HOME_PUBLISHED = "home:{}"
 
 TRAIL_VALUE_2_DESC = {
     "tll": "Lace Lichen",
@@ -6,24 +6,39 @@ https://www.drupal.org/docs/8/core/modules/jsonapi-module
 """
 
 import cachetools.func
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import dateutil
 import logging
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import requests
 
 from constants import TYPE_DISTURBANCE
+from utils import chunks
 
 logger = logging.getLogger(__name__)
 
 
 class DrupalApi:
-    def __init__(self, username, password, server_url, ssl_verify):
+    def __init__(
+        self,
+        username,
+        password,
+        server_url,
+        ssl_verify,
+        max_workers=4,
+        response_cache=None,
+    ):
         if not username or not password:
             raise ValueError("username and/or password not specified")
         self.username = username
         self.password = password
         self.server_url = server_url
+        # max concurrent requests when fetching in parallel
+        self.max_workers = max_workers
+        # http_cache.ConditionalCache for GETs
+        self.response_cache = response_cache
         self.session = requests.session()
 
         self.session.headers.update(
@@ -35,23 +50,99 @@ class DrupalApi:
         self.session.auth = (username, password)
         self.session.verify = ssl_verify
 
-    def simple_get(self, path, params, fetchall=True):
+    def simple_get(self, path, params, fetchall=True, parallel=False):
+        """
+        Return the 'data' from all pages.
+
+        With parallel - once the first page tells us the total count and the
+        offset/limit used for paging, the remaining pages are fetched concurrently
+        (and returned in order). If the server doesn't return a count we fall back
+        to following 'next' links one at a time.
+        """
         next_batch = f"{self.server_url}{path}"
+        if not fetchall:
+            return self._get_page(next_batch, params)["data"]
+
         rdata = []
-        while next_batch:
-            rv = self.session.get(next_batch, params=params)
-            rv.raise_for_status()
-            jbody = rv.json()
+        if parallel:
+            jbody = self._get_page(next_batch, params)
             rdata.extend(jbody["data"])
-            if fetchall:
-                next_batch = jbody["links"].get("next", None)
-            else:
-                next_batch = None
-            if next_batch:
-                next_batch = next_batch["href"]
-                params = {}
+            next_batch = jbody["links"].get("next", None)
+            if not next_batch:
+                return rdata
+            next_batch = next_batch["href"]
+            params = {}
+            page_urls = self._page_urls(next_batch, jbody)
+            if page_urls:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    for page in executor.map(self._get_page, page_urls):
+                        rdata.extend(page["data"])
+                return rdata
+            logger.info(f"No count returned for {path} - fetching pages sequentially")
+        for page in self._iter_pages(next_batch, params):
+            rdata.extend(page)
         return rdata
 
+    def iter_pages(self, path, params=None):
+        """
+        Yield the 'data' of each page in turn.
+        The next page is requested while the caller works on the current one -
+        so at most 2 pages are held in memory.
+        """
+        yield from self._iter_pages(f"{self.server_url}{path}", params)
+
+    def iter_resources(self, path, params=None):
+        """Yield each resource of a collection (see iter_pages)."""
+        for page in self.iter_pages(path, params):
+            yield from page
+
+    def _iter_pages(self, next_batch, params):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(self._get_page, next_batch, params)
+            while pending:
+                jbody = pending.result()
+                next_batch = jbody["links"].get("next", None)
+                pending = None
+                if next_batch:
+                    pending = executor.submit(self._get_page, next_batch["href"])
+                yield jbody["data"]
+
+    def _get_page(self, url, params=None):
+        if self.response_cache:
+            return self.response_cache.get(self.session, url, params)
+        rv = self.session.get(url, params=params)
+        rv.raise_for_status()
+        return rv.json()
+
+    @staticmethod
+    def _page_urls(next_href, jbody):
+        """
+        From the 'next' link of the first page, build the URLs of all remaining
+        pages. Returns None if we can't figure that out.
+        """
+        count = jbody.get("meta", {}).get("count", None)
+        parts = urlsplit(next_href)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        qdict = dict(query)
+        if count is None or "page[offset]" not in qdict:
+            return None
+        try:
+            count = int(count)
+            offset = int(qdict["page[offset]"])
+            limit = int(qdict.get("page[limit]", len(jbody["data"])))
+        except ValueError:
+            return None
+        if limit <= 0:
+            return None
+
+        urls = []
+        for page_offset in range(offset, count, limit):
+            pquery = [
+                (k, str(page_offset) if k == "page[offset]" else v) for k, v in query
+            ]
+            urls.append(urlunsplit(parts._replace(query=urlencode(pquery))))
+        return urls
+
     def get_activity_views(self):
         """
         Get activity views.
@@ -103,12 +194,8 @@ class DrupalApi:
         else:
             tterm = which
 
-        rv = self.session.get(f"{self.server_url}/taxonomy_term/{tterm}")
-        rv.raise_for_status()
-        jbody = rv.json()
-
         terms = list()
-        for d in jbody["data"]:
+        for d in self.iter_resources(f"/taxonomy_term/{tterm}"):
             terms.append({"name": d["attributes"]["name"], "id": d["id"]})
         if not terms:
             # that isn't right - don't cache
@@ -228,23 +315,71 @@ class DrupalApi:
         """
 
         users = {}
-        next_batch = f"{self.server_url}/user/user"
-        while next_batch:
-            rv = self.session.get(next_batch)
-            rv.raise_for_status()
-            jbody = rv.json()
-
-            for d in jbody["data"]:
-                users[d["id"]] = d["attributes"]
-            next_batch = jbody["links"].get("next", None)
-            if next_batch:
-                next_batch = next_batch["href"]
+        for d in self.iter_resources("/user/user"):
+            users[d["id"]] = d["attributes"]
+        return users
 
+    def get_users_changed_since(self, since, fields=None):
+        """
+        Return dict (same as get_all_users) of users whose 'changed' timestamp
+        is at or after since (epoch seconds). fields limits the attributes
+        returned.
+        """
+        params = {
+            "filter[changed][condition][path]": "changed",
+            "filter[changed][condition][operator]": ">=",
+            "filter[changed][condition][value]": int(since),
+            "sort": "changed",
+        }
+        if fields:
+            params["fields[user--user]"] = ",".join(fields)
+        users = {}
+        for d in self.iter_resources("/user/user", params):
+            users[d["id"]] = d["attributes"]
+        return users
+
+    def get_in(self, path, field, values, params=None, chunk_size=50, max_workers=None):
+        """
+        Return all resources whose field is one of values.
+        values are split into chunks of chunk_size (to keep URLs reasonable) and
+        the chunks are fetched concurrently (at most max_workers at a time).
+        Results are returned in chunk order.
+        """
+        chunk_params = []
+        for chunk in chunks(dict.fromkeys(values), chunk_size):
+            cparams = dict(params or {})
+            cparams.update(
+                {
+                    "filter[in][condition][path]": field,
+                    "filter[in][condition][operator]": "IN",
+                }
+            )
+            for n, value in enumerate(chunk):
+                cparams[f"filter[in][condition][value][{n}]"] = value
+            chunk_params.append(cparams)
+
+        rdata = []
+        if len(chunk_params) == 1:
+            return self.simple_get(path, chunk_params[0], parallel=True)
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as ex:
+            for data in ex.map(lambda cp: self.simple_get(path, cp), chunk_params):
+                rdata.extend(data)
+        return rdata
+
+    def get_users(self, user_uuids, fields=None, chunk_size=50):
+        """
+        Fetch many users with as few requests as possible.
+        Returns dict of {uuid: attributes} (users we can't see are left out).
+        """
+        params = {}
+        if fields:
+            params["fields[user--user]"] = ",".join(fields)
+        users = {}
+        for d in self.get_in("/user/user", "id", user_uuids, params, chunk_size):
+            users[d["id"]] = d["attributes"]
         return users
 
     @cachetools.func.ttl_cache(60, ttl=(60 * 5))
     def get_user(self, user_uuid):
-        rv = self.session.get(f"{self.server_url}/user/user/{user_uuid}")
-        rv.raise_for_status()
-        jbody = rv.json()
+        jbody = self._get_page(f"{self.server_url}/user/user/{user_uuid}")
         return jbody["data"]
@@ -2,17 +2,33 @@
 
 """
 Use dynamoDB for our at cache.
+
+Reads go through 2 optional local tiers first - a bounded in-memory TTL LRU
+and a file backed tier (e.g. in /tmp which survives across warm lambda
+invocations).
 """
 
 from datetime import datetime
 from dateutil import tz
+import hashlib
 import logging
 import json
+import os
+import tempfile
+import threading
+import time
+import zlib
 
 import boto3
+import cachetools
+
+from utils import chunks
 
 TN_LOOKUP = {"cache": "cache"}
 
+# Epoch seconds after which DynamoDB may delete the item (see DDBCache.put).
+TTL_ATTRIBUTE = "cexpires"
+
 TABLES = [
     {
         "TableName": "cache",
@@ -60,6 +76,24 @@ class DDB:
                     f" APP: create_all: Creating table {table['TableName']}"
                 )
                 self.client.create_table(**table)
+                self.client.get_waiter("table_exists").wait(
+                    TableName=table["TableName"]
+                )
+            rv = self.client.describe_time_to_live(TableName=table["TableName"])
+            if rv["TimeToLiveDescription"]["TimeToLiveStatus"] in [
+                "DISABLED",
+                "DISABLING",
+            ]:
+                self._logger.info(
+                    f"APP: create_all: Enabling TTL on table {table['TableName']}"
+                )
+                self.client.update_time_to_live(
+                    TableName=table["TableName"],
+                    TimeToLiveSpecification={
+                        "Enabled": True,
+                        "AttributeName": TTL_ATTRIBUTE,
+                    },
+                )
 
     def destroy_all(self):
         for t in TABLES:
@@ -67,68 +101,379 @@ class DDB:
             self.client.delete_table(t["TableName"])
 
 
+class FileTier:
+    """Cache raw (JSON) values in files - each with its own expiry."""
+
+    def __init__(self, directory, ttl):
+        self._directory = directory
+        self._ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, ckey):
+        return os.path.join(self._directory, hashlib.sha1(ckey.encode()).hexdigest())
+
+    def get(self, ckey):
+        try:
+            with open(self._path(ckey)) as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] < time.time():
+            return None
+        return entry["raw"]
+
+    def put(self, ckey, raw):
+        fd, tmp = tempfile.mkstemp(dir=self._directory)
+        with os.fdopen(fd, "w") as fp:
+            json.dump({"expires": time.time() + self._ttl, "raw": raw}, fp)
+        os.replace(tmp, self._path(ckey))
+
+    def delete(self, ckey):
+        try:
+            os.remove(self._path(ckey))
+        except FileNotFoundError:
+            pass
+
+
 class DDBCache:
     """
     Cache things.
-    The record is simple - just ckey, cvalue
+    The record is simple - just ckey, cvalue (and a digest of cvalue)
     Value should be a json serializable value
+
+    cvalue is stored as a JSON string - or if CACHE_COMPRESS_THRESHOLD is set
+    and the JSON is at least that long, as zlib compressed JSON in a binary
+    attribute with cfmt (the format marker) set to FMT_JSON_ZLIB.
+
+    Items written with a ttl get an expiry (TTL_ATTRIBUTE). DynamoDB can take
+    a long time to actually delete expired items - so reads treat them as
+    missing. Local DynamoDB never deletes them - see prune().
     """
 
+    FMT_JSON_ZLIB = "json+zlib"
+
+    # DynamoDB limits for Batch{Get,Write}Item
+    BATCH_GET_MAX = 100
+    BATCH_WRITE_MAX = 25
+    BATCH_RETRIES = 5
+
     def __init__(self, config, ddb: DDB):
         self._config = config
         self._logger = logging.getLogger(__name__)
         self._client = ddb.client
+        self._compress_threshold = config.get("CACHE_COMPRESS_THRESHOLD", None)
+        if self._compress_threshold:
+            self._compress_threshold = int(self._compress_threshold)
 
-    def get(self, ckey):
-        cn = TN_LOOKUP["cache"]
-        rv = self._client.query(
-            TableName=cn,
-            KeyConditionExpression="ckey = :ckey",
-            ExpressionAttributeValues={":ckey": {"S": ckey}},
-        )
-        if len(rv["Items"]) != 1:
-            if len(rv["Items"]) > 1:
-                self._logger.error(
-                    f"APP: get: Received multiple results for ckey {ckey}"
-                )
-            return None
-        cvalue = json.loads(rv["Items"][0]["cvalue"]["S"])
+        # Local tiers hold the raw JSON - so callers can't change cached values.
+        self._lock = threading.Lock()
+        self._l1 = None
+        if int(config.get("CACHE_L1_SIZE", 0)):
+            self._l1 = cachetools.TTLCache(
+                int(config["CACHE_L1_SIZE"]), int(config.get("CACHE_L1_TTL", 60))
+            )
+        self._l2 = None
+        if config.get("CACHE_L2_DIR", None):
+            self._l2 = FileTier(
+                config["CACHE_L2_DIR"], int(config.get("CACHE_L2_TTL", 300))
+            )
+        self._stats = {t: {"hits": 0, "misses": 0} for t in ["l1", "l2"]}
+        self._stats["ddb"] = {"reads": 0}
+
+    def tier_stats(self):
+        """Hit/miss counts for each local tier and # of keys read from DDB."""
+        with self._lock:
+            return {t: dict(v) for t, v in self._stats.items()}
+
+    def _tier_get(self, ckey):
+        if self._l1 is not None:
+            with self._lock:
+                raw = self._l1.get(ckey, None)
+                self._stats["l1"]["hits" if raw is not None else "misses"] += 1
+            if raw is not None:
+                return raw
+        if self._l2:
+            raw = self._l2.get(ckey)
+            with self._lock:
+                self._stats["l2"]["hits" if raw is not None else "misses"] += 1
+            if raw is not None:
+                if self._l1 is not None:
+                    with self._lock:
+                        self._l1[ckey] = raw
+                return raw
+        return None
+
+    def _tier_put(self, ckey, raw):
+        if self._l1 is not None:
+            with self._lock:
+                self._l1[ckey] = raw
+        if self._l2:
+            self._l2.put(ckey, raw)
+
+    def _invalidate(self, ckey):
+        if self._l1 is not None:
+            with self._lock:
+                self._l1.pop(ckey, None)
+        if self._l2:
+            self._l2.delete(ckey)
+
+    def _log_counts(self, what, cvalue):
+        if isinstance(cvalue, dict):
+            entries_per_title = {
+                t: len(v) for t, v in cvalue.items() if isinstance(v, (list, dict))
+            }
+            self._logger.info(f"APP: {what}: counts:{entries_per_title}")
+
+    @staticmethod
+    def _expired(item, now):
+        return TTL_ATTRIBUTE in item and int(item[TTL_ATTRIBUTE]["N"]) <= now
+
+    def _raw(self, item):
+        # Return JSON string from either format
+        if "S" in item["cvalue"]:
+            return item["cvalue"]["S"]
+        cfmt = item.get("cfmt", {}).get("S", None)
+        if cfmt != self.FMT_JSON_ZLIB:
+            raise ValueError(f"APP: Unknown cache value format {cfmt}")
+        return zlib.decompress(item["cvalue"]["B"]).decode()
+
+    def _decode(self, raw):
+        cvalue = json.loads(raw)
         if isinstance(cvalue, dict):
             self._logger.debug(f"APP: get: {cvalue.items()}")
-            entries_per_title = {t: len(v) for t, v in cvalue.items()}
-            self._logger.info(f"APP: get: atinfo counts:{entries_per_title}")
+        self._log_counts("get", cvalue)
         return cvalue
 
-    def put(self, ckey, cvalue, only_if_changed=True):
-        cn = TN_LOOKUP["cache"]
-        new_value = json.dumps(cvalue)
-        if only_if_changed:
-            rv = self._client.query(
-                TableName=cn,
-                KeyConditionExpression="ckey = :ckey",
-                ExpressionAttributeValues={":ckey": {"S": ckey}},
+    def _item(self, ckey, new_value, ttl=None):
+        self._logger.debug(
+            "APP: put: Setting cache key {} to table {} value {}".format(
+                ckey, TN_LOOKUP["cache"], new_value
             )
-            if len(rv["Items"]) == 1 and (rv["Items"][0]["cvalue"]["S"] == new_value):
-                self._logger.info(f"APP: put: Cache key {ckey} value unchanged")
-                return
-
+        )
         item = {
             "ckey": {"S": ckey},
             "cvalue": {"S": new_value},
+            "cdigest": {"S": hashlib.sha256(new_value.encode()).hexdigest()},
             "update_datetime": {"S": datetime.now(tz.tzutc()).isoformat()},
         }
-        self._logger.debug(
-            "APP: put: Setting cache key {} to table {} value {}".format(
-                ckey, cn, new_value
-            )
+        if self._compress_threshold and len(new_value) >= self._compress_threshold:
+            item["cvalue"] = {"B": zlib.compress(new_value.encode())}
+            item["cfmt"] = {"S": self.FMT_JSON_ZLIB}
+        if ttl:
+            item[TTL_ATTRIBUTE] = {"N": str(int(time.time() + ttl))}
+        return item
+
+    def _backoff(self, attempt, what):
+        if attempt >= self.BATCH_RETRIES:
+            raise RuntimeError(f"APP: {what}: unprocessed items after retries")
+        time.sleep(0.05 * (2**attempt))
+
+    def get(self, ckey, consistent=False):
+        """
+        Point read of ckey - consistent=True for a strongly consistent read
+        (twice the read capacity) which also skips the local tiers.
+        """
+        if not consistent:
+            raw = self._tier_get(ckey)
+            if raw is not None:
+                return self._decode(raw)
+
+        with self._lock:
+            self._stats["ddb"]["reads"] += 1
+        rv = self._client.get_item(
+            TableName=TN_LOOKUP["cache"],
+            Key={"ckey": {"S": ckey}},
+            ProjectionExpression=f"cvalue, cfmt, {TTL_ATTRIBUTE}",
+            ConsistentRead=consistent,
         )
-        if isinstance(cvalue, dict):
-            entries_per_title = {t: len(v) for t, v in cvalue.items()}
-            self._logger.info(f"APP: put: counts:{entries_per_title}")
-        self._client.put_item(TableName=cn, Item=item)
+        if "Item" not in rv or self._expired(rv["Item"], time.time()):
+            return None
+        raw = self._raw(rv["Item"])
+        self._tier_put(ckey, raw)
+        return self._decode(raw)
+
+    def get_many(self, ckeys, consistent=False):
+        """
+        Get many keys with as few round trips as possible (BatchGetItem).
+        Returns dict {ckey: cvalue} - cvalue is None for missing keys.
+        """
+        results = {ckey: None for ckey in ckeys}
+        needed = []
+        for ckey in results:
+            raw = None if consistent else self._tier_get(ckey)
+            if raw is not None:
+                results[ckey] = self._decode(raw)
+            else:
+                needed.append(ckey)
+        with self._lock:
+            self._stats["ddb"]["reads"] += len(needed)
+
+        projection = f"ckey, cvalue, cfmt, {TTL_ATTRIBUTE}"
+        now = time.time()
+        for item in self._batch_get(needed, projection, consistent, "get_many"):
+            if self._expired(item, now):
+                continue
+            raw = self._raw(item)
+            self._tier_put(item["ckey"]["S"], raw)
+            results[item["ckey"]["S"]] = self._decode(raw)
+        return results
+
+    def _batch_get(self, ckeys, projection, consistent, what):
+        # Yield stored items for ckeys (BatchGetItem)
+        cn = TN_LOOKUP["cache"]
+        for chunk in chunks(ckeys, self.BATCH_GET_MAX):
+            request = {
+                cn: {
+                    "Keys": [{"ckey": {"S": ckey}} for ckey in chunk],
+                    "ProjectionExpression": projection,
+                    "ConsistentRead": consistent,
+                }
+            }
+            attempt = 0
+            while request:
+                rv = self._client.batch_get_item(RequestItems=request)
+                yield from rv["Responses"].get(cn, [])
+                request = rv.get("UnprocessedKeys", None)
+                if request:
+                    self._backoff(attempt, what)
+                    attempt += 1
+
+    def _unchanged(self, items, ttl):
+        # Return ckeys of items ({ckey: new item}) that needn't be written -
+        # same rules as the put condition.
+        renew = time.time() + ttl / 2 if ttl else None
+        unchanged = set()
+        projection = f"ckey, cdigest, {TTL_ATTRIBUTE}"
+        for stored in self._batch_get(list(items), projection, False, "put_many"):
+            ckey = stored["ckey"]["S"]
+            if stored.get("cdigest", None) != items[ckey]["cdigest"]:
+                continue
+            if renew is None:
+                if TTL_ATTRIBUTE in stored:
+                    continue
+            elif TTL_ATTRIBUTE not in stored or int(stored[TTL_ATTRIBUTE]["N"]) < renew:
+                continue
+            unchanged.add(ckey)
+        return unchanged
+
+    def put(self, ckey, cvalue, only_if_changed=True, ttl=None):
+        """
+        Returns True if the stored value changed - False if it was the same
+        (even if its expiry was updated).
+        With only_if_changed the write is skipped (in the same round trip)
+        if the stored digest matches the new value's - unless the stored
+        expiry needs updating (it is more than half way to expiring or it
+        should now have none).
+        ttl - seconds until the item expires (None for never).
+        """
+        cn = TN_LOOKUP["cache"]
+        raw = json.dumps(cvalue)
+        item = self._item(ckey, raw, ttl)
+        self._log_counts("put", cvalue)
+        kwargs = {}
+        if only_if_changed:
+            kwargs = {
+                "ConditionExpression": "attribute_not_exists(cdigest)"
+                " OR cdigest <> :cdigest",
+                "ExpressionAttributeValues": {":cdigest": item["cdigest"]},
+            }
+            if ttl:
+                kwargs["ConditionExpression"] += (
+                    f" OR attribute_not_exists({TTL_ATTRIBUTE})"
+                    f" OR {TTL_ATTRIBUTE} < :renew"
+                )
+                kwargs["ExpressionAttributeValues"][":renew"] = {
+                    "N": str(int(time.time() + ttl / 2))
+                }
+            else:
+                # Keep forever - so drop any expiry.
+                keep_forever = f" OR attribute_exists({TTL_ATTRIBUTE})"
+                kwargs["ConditionExpression"] += keep_forever
+        try:
+            # Old item (no extra capacity) tells us if the value changed.
+            rv = self._client.put_item(
+                TableName=cn, Item=item, ReturnValues="ALL_OLD", **kwargs
+            )
+        except self._client.exceptions.ConditionalCheckFailedException:
+            self._logger.info(f"APP: put: Cache key {ckey} value unchanged")
+            self._invalidate(ckey)
+            return False
+        # Update the tiers only after the write - so a concurrent read can't
+        # leave the old value in them.
+        self._tier_put(ckey, raw)
+        old = rv.get("Attributes", {})
+        if old.get("cdigest", None) == item["cdigest"]:
+            self._logger.info(f"APP: put: Cache key {ckey} expiry updated")
+            return False
+        return True
+
+    def put_many(self, items, ttl=None, only_if_changed=False):
+        """
+        Put many {ckey: cvalue} with as few round trips as possible
+        (BatchWriteItem). Returns # of items written.
+        With only_if_changed the stored digests are read first (BatchGetItem)
+        and unchanged items (see put) are skipped.
+        ttl - seconds until the items expire (None for never).
+        """
+        raws = {}
+        new_items = {}
+        for ckey, cvalue in items.items():
+            self._log_counts("put", cvalue)
+            raws[ckey] = json.dumps(cvalue)
+            new_items[ckey] = self._item(ckey, raws[ckey], ttl)
+        skip = self._unchanged(new_items, ttl) if only_if_changed else set()
+        if skip:
+            self._logger.info(f"APP: put_many: {len(skip)} cache values unchanged")
+        requests = [
+            {"PutRequest": {"Item": item}}
+            for ckey, item in new_items.items()
+            if ckey not in skip
+        ]
+        self._batch_write(requests, "put_many")
+        for ckey, raw in raws.items():
+            self._tier_put(ckey, raw)
+        return len(requests)
+
+    def _batch_write(self, requests, what):
+        cn = TN_LOOKUP["cache"]
+        for chunk in chunks(requests, self.BATCH_WRITE_MAX):
+            request = {cn: chunk}
+            attempt = 0
+            while request:
+                rv = self._client.batch_write_item(RequestItems=request)
+                request = rv.get("UnprocessedItems", None)
+                if request:
+                    self._backoff(attempt, what)
+                    attempt += 1
 
     def delete(self, ckey):
         self._logger.info(f"APP: delete: Deleting ckey {ckey} from cache")
         self._client.delete_item(
             TableName=TN_LOOKUP["cache"], Key={"ckey": {"S": ckey}}
         )
+        self._invalidate(ckey)
+
+    def prune(self):
+        """
+        Delete expired items - returns # deleted.
+        DynamoDB does this itself (eventually) but local DynamoDB doesn't.
+        """
+        cn = TN_LOOKUP["cache"]
+        kwargs = {
+            "TableName": cn,
+            "ProjectionExpression": "ckey",
+            "FilterExpression": f"{TTL_ATTRIBUTE} <= :now",
+            "ExpressionAttributeValues": {":now": {"N": str(int(time.time()))}},
+        }
+        requests = []
+        while True:
+            rv = self._client.scan(**kwargs)
+            for item in rv["Items"]:
+                self._invalidate(item["ckey"]["S"])
+                requests.append({"DeleteRequest": {"Key": {"ckey": item["ckey"]}}})
+            if "LastEvaluatedKey" not in rv:
+                break
+            kwargs["ExclusiveStartKey"] = rv["LastEvaluatedKey"]
+        self._batch_write(requests, "prune")
+        self._logger.info(f"APP: prune: Deleted {len(requests)} expired items")
+        return len(requests)
@@ -2,40 +2,63 @@
 
 """
 Handle new 'Home' tab.
-For now - this is a static view.
+For now - this is a static view - so we only publish it when it changes.
 """
 import logging
 
 import asyncev
-from constants import TYPE_TRAIL, TYPE_DISTURBANCE
-from slack_api import post
-from utils import buttons_block, divider_block, text_block
+from constants import CKEY_HOME_PUBLISHED, TYPE_TRAIL, TYPE_DISTURBANCE
+from slack_api import post_raw
+from utils import ViewTemplate, buttons_block, divider_block, splice_json, text_block
 
 
 logger = logging.getLogger("home")
 
 
+def _home_view(enable_trail_report):
+    b = []
+    b.append(text_block("Welcome"))
+    b.append(divider_block())
+    if enable_trail_report:
+        b.append(buttons_block("HOMETRAILREP:0", [("Create Trail Report", TYPE_TRAIL)]))
+    b.append(
+        buttons_block(
+            "HOMEDISTREP:0", [("Create Disturbance Report", TYPE_DISTURBANCE)]
+        )
+    )
+    b.append(divider_block())
+    b.append(text_block("Who's at the reserve:"))
+    b.append(buttons_block("HOMEAT", [("Today", "Today"), ("Tomorrow", "Tomorrow")]))
+    return {"type": "home", "blocks": b}
+
+
+# Keyed by ENABLE_TRAIL_REPORT
+HOME_VIEWS = {enable: ViewTemplate(_home_view(enable)) for enable in [True, False]}
+
+
 def handle_home(event):
     """When user opens home tab we get this event"""
     app = asyncev.wapp
     with app.app_context():
-        b = []
-        b.append(text_block("Welcome"))
-        b.append(divider_block())
-        if app.config["ENABLE_TRAIL_REPORT"]:
-            b.append(
-                buttons_block("HOMETRAILREP:0", [("Create Trail Report", TYPE_TRAIL)])
-            )
-        b.append(
-            buttons_block(
-                "HOMEDISTREP:0", [("Create Disturbance Report", TYPE_DISTURBANCE)]
-            )
+        template = HOME_VIEWS[bool(app.config["ENABLE_TRAIL_REPORT"])]
+        # Slack sends this every time the tab is looked at - only publish
+        # if it has changed since we last published it to this user.
+        published = "{}:{}".format(
+            app.config.get("HOME_PUBLISH_EPOCH", 0), template.digest
         )
-        b.append(divider_block())
-        b.append(text_block("Who's at the reserve:"))
-        b.append(
-            buttons_block("HOMEAT", [("Today", "Today"), ("Tomorrow", "Tomorrow")])
+        ckey = CKEY_HOME_PUBLISHED.format(event["user"])
+        if app.ddb_cache.get(ckey) == published:
+            logger.info(f"Home view for {event['user']} unchanged - not publishing")
+            return {}
+
+        rv = post_raw(
+            "views.publish",
+            splice_json("{}", user_id=event["user"], view=template.render()),
         )
-        view = {"type": "home", "blocks": b}
-        post("views.publish", payload={"user_id": event["user"], "view": view})
+        if rv:
+            app.ddb_cache.put(
+                ckey,
+                published,
+                ttl=int(app.config.get("HOME_PUBLISH_TTL", 7 * 24 * 60 * 60)),
+            )
     return {}
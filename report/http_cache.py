@@ -0,0 +1,161 @@
+# Copyright 2024 by J. Christopher Wagner (jwag). All rights reserved.
+
+"""
+HTTP conditional request (ETag / Last-Modified) cache for DrupalApi GETs.
+
+Response bodies are stored along with their validators and sent back as
+If-None-Match/If-Modified-Since - a 304 is then served from the stored body.
+Where bodies are stored is pluggable - in memory, on local disk or in the
+DDB cache table.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import cachetools
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    def __init__(self, max_bytes):
+        # Least recently used bodies are dropped past max_bytes.
+        self._lock = threading.Lock()
+        self._entries = cachetools.LRUCache(max_bytes, getsizeof=lambda e: e["size"])
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key, None)
+
+    def put(self, key, entry):
+        with self._lock:
+            try:
+                self._entries[key] = entry
+            except ValueError:
+                # Bigger than the whole cache
+                pass
+
+
+class FileStore:
+    def __init__(self, directory):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(
+            self._directory, hashlib.sha1(key.encode()).hexdigest() + ".json"
+        )
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, entry):
+        fd, tmp = tempfile.mkstemp(dir=self._directory)
+        with os.fdopen(fd, "w") as fp:
+            json.dump(entry, fp)
+        os.replace(tmp, self._path(key))
+
+
+class DDBStore:
+    # Stay well clear of the 400KB item limit.
+    MAX_SIZE = 300 * 1024
+
+    def __init__(self, ddb_cache, ttl, prefix="http:"):
+        self._ddb_cache = ddb_cache
+        self._ttl = ttl
+        self._prefix = prefix
+
+    def _ckey(self, key):
+        return self._prefix + hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key):
+        return self._ddb_cache.get(self._ckey(key))
+
+    def put(self, key, entry):
+        if entry["size"] <= self.MAX_SIZE:
+            self._ddb_cache.put(
+                self._ckey(key), entry, only_if_changed=False, ttl=self._ttl
+            )
+
+
+class ConditionalCache:
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._not_modified = 0
+        self._bytes_saved = 0
+
+    def get(self, session: requests.Session, url, params=None):
+        """GET url and return decoded JSON body."""
+        url = requests.Request("GET", url, params=params).prepare().url
+        entry = self._store.get(url)
+        headers = {}
+        if entry:
+            if entry.get("etag", None):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified", None):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        rv = session.get(url, headers=headers)
+        with self._lock:
+            self._requests += 1
+        if rv.status_code == 304 and entry:
+            with self._lock:
+                self._not_modified += 1
+                self._bytes_saved += entry["size"]
+            return json.loads(entry["body"])
+        rv.raise_for_status()
+
+        etag = rv.headers.get("ETag", None)
+        last_modified = rv.headers.get("Last-Modified", None)
+        if etag or last_modified:
+            self._store.put(
+                url,
+                {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "body": rv.text,
+                    "size": len(rv.content),
+                },
+            )
+        return rv.json()
+
+    def stats(self):
+        """Requests made, how many were answered 304 and bytes not transferred."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "not_modified": self._not_modified,
+                "bytes_saved": self._bytes_saved,
+            }
+
+
+def from_config(config, ddb_cache=None):
+    """Return a ConditionalCache per PLSNR_HTTP_CACHE (or None)."""
+    which = config.get("PLSNR_HTTP_CACHE", None)
+    if not which:
+        return None
+    if which == "memory":
+        store = MemoryStore(
+            int(config.get("PLSNR_HTTP_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+        )
+    elif which == "file":
+        store = FileStore(config.get("PLSNR_HTTP_CACHE_DIR", "/tmp/plsnr-http"))
+    elif which == "ddb":
+        store = DDBStore(
+            ddb_cache, int(config.get("PLSNR_HTTP_CACHE_TTL", 2 * 24 * 60 * 60))
+        )
+    else:
+        raise ValueError(f"Unknown PLSNR_HTTP_CACHE {which}")
+    logger.info(f"Using {which} HTTP response cache")
+    return ConditionalCache(store)
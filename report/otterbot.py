@@ -12,12 +12,12 @@ from random import randint
 import re
 import traceback
 
+import aslack_api
 import asyncev
 
 from quotes import QUOTES
 from slack_api import (
     get_file_info,
-    delete_message,
     post_ephemeral_message,
     user_to_name,
 )
@@ -117,8 +117,7 @@ def talk_to_me(event_id, event):
                             )
                         )
                         blocks.append(text_block(text))
-                post_ephemeral_message(event["channel"], event["user"], blocks)
-                delete_message(event["channel"], event["ts"])
+                pme_and_delete(event, blocks)
 
             elif re.match(r"(TR|DR|[12][0-9])", whatsup[1], re.IGNORECASE):
                 # <report_id> photo
@@ -182,6 +181,7 @@ def talk_to_me(event_id, event):
                             pme(event, "Usage: at delete key")
                             return
                         app.ddb_cache.delete(whatsup[3])
+                        app.ddb_cache.delete(utils.render_ckey(whatsup[3]))
                         return
 
                     if re.match(r"tom", whatsup[2], re.IGNORECASE):
@@ -206,7 +206,13 @@ def talk_to_me(event_id, event):
                         lday.isoformat(), ckey
                     )
                 )
-                atinfo = app.ddb_cache.get(ckey)
+                # One round trip for both - the rendered copy is normally there.
+                cached = app.ddb_cache.get_many([utils.render_ckey(ckey), ckey])
+                rendered = utils.current_render(cached[utils.render_ckey(ckey)])
+                if rendered:
+                    pme_and_delete(event, utils.RawJSON(rendered["blocks"]))
+                    return
+                atinfo = cached[ckey]
                 if not atinfo:
                     pme(
                         event,
@@ -218,11 +224,11 @@ def talk_to_me(event_id, event):
                         ],
                     )
                     atinfo = app.sa.whoat(lday.strftime("%Y%m%d"), where)
-                    app.ddb_cache.put(ckey, atinfo)
+                    at_ttl = app.config.get("CACHE_AT_TTL", None)
+                    app.ddb_cache.put(ckey, atinfo, ttl=int(at_ttl) if at_ttl else None)
                 blocks = utils.atinfo_to_blocks(atinfo, lday)
 
-                delete_message(event["channel"], event["ts"])
-                pme(event, blocks)
+                pme_and_delete(event, blocks)
             elif re.match(r"whoswho", whatsup[1], re.IGNORECASE):
                 whoswho, unmatched = app.report.whoswho()
             else:
@@ -240,8 +246,7 @@ def talk_to_me(event_id, event):
                         "https://media.giphy.com/media/drxyCDMT7kkvu1FWNZ/giphy.gif",
                     )
                 )
-                delete_message(event["channel"], event["ts"])
-                pme(event, blocks)
+                pme_and_delete(event, blocks)
     except Exception as exc:
         logger.error(
             "Exception in talk_to_me text: {} {}:{}".format(
@@ -254,3 +259,24 @@ def talk_to_me(event_id, event):
 
 def pme(event, text):
     post_ephemeral_message(event["channel"], event["user"], text)
+
+
+def pme_and_delete(event, text):
+    # Reply and clean up the request message at the same time.
+    # text can also be pre-rendered blocks (utils.RawJSON).
+    if isinstance(text, utils.RawJSON):
+        reply = aslack_api.post_raw(
+            "chat.postEphemeral",
+            utils.splice_json(
+                '{"text": "Here ya go!", "as_user": true}',
+                channel=event["channel"],
+                user=event["user"],
+                blocks=text,
+            ),
+        )
+    else:
+        reply = aslack_api.post_ephemeral_message(event["channel"], event["user"], text)
+    asyncev.run_concurrently(
+        aslack_api.delete_message(event["channel"], event["ts"]),
+        reply,
+    )
@@ -5,6 +5,7 @@ import logging
 
 import asyncev
 from constants import (
+    CKEY_DISTURBANCE_VIEW,
     CKEY_OTHER_ISSUES,
     CKEY_WILDLIFE_ISSUES,
     CKEY_PLACES,
@@ -15,8 +16,17 @@ from constants import (
     ISSUES_2_DESC,
 )
 import exc
-from slack_api import post, post_message, user_to_name
-from utils import input_block, pt_input_element, select_element, multi_select_element
+from slack_api import post_message, post_raw, user_to_name
+from utils import (
+    RawJSON,
+    ViewTemplate,
+    current_render,
+    input_block,
+    pt_input_element,
+    render_disturbance_view,
+    select_element,
+    splice_json,
+)
 
 
 logger = logging.getLogger("report")
@@ -36,7 +46,7 @@ def _parse_values(field, values):
     return None
 
 
-def open_trail_report_modal(trigger, state):
+def _trail_view():
     trail_options = []
     for n, d in TRAIL_VALUE_2_DESC.items():
         trail_options.append((d, n))
@@ -89,14 +99,20 @@ def open_trail_report_modal(trigger, state):
         "callback_id": TYPE_TRAIL,
         "title": {"type": "plain_text", "text": "Trail Report"},
         "notify_on_close": True,
-        "private_metadata": state,
         "submit": {"type": "plain_text", "text": "Create"},
         "close": {"type": "plain_text", "text": "Cancel"},
         "blocks": blocks,
     }
+    return view
+
+
+TRAIL_VIEW = ViewTemplate(_trail_view())
 
+
+def open_trail_report_modal(trigger, state):
+    view = TRAIL_VIEW.render(private_metadata=state)
     try:
-        post("views.open", dict(trigger_id=trigger, view=view))
+        post_raw("views.open", splice_json("{}", trigger_id=trigger, view=view))
     except exc.SlackApiError as ex:
         if "trigger_expired" in repr(ex):
             logger.warning("Received trigger expired - ignoring")
@@ -109,92 +125,41 @@ def open_disturbance_report_modal(trigger, state):
     Even though we are async - we only have 3 seconds to use the trigger.
     We assume the cache should be primed via a zappa task - but we will self-prime
     here for testing.
+    Normally this is a single cache read of the pre-rendered view - all that is
+    left is to add the private_metadata.
     """
 
     app = asyncev.wapp
     with app.app_context():
-        wildlife_issues = app.ddb_cache.get(CKEY_WILDLIFE_ISSUES)
-        if not wildlife_issues:
-            wildlife_issues = app.report.get_wildlife_issue_list()
-            app.ddb_cache.put(CKEY_WILDLIFE_ISSUES, wildlife_issues)
+        rendered = current_render(app.ddb_cache.get(CKEY_DISTURBANCE_VIEW))
+        if not rendered:
+            # One round trip for all the lists
+            cached = app.ddb_cache.get_many(
+                [CKEY_WILDLIFE_ISSUES, CKEY_OTHER_ISSUES, CKEY_PLACES]
+            )
+            wildlife_issues = cached[CKEY_WILDLIFE_ISSUES]
+            if not wildlife_issues:
+                wildlife_issues = app.report.get_wildlife_issue_list()
+                app.ddb_cache.put(CKEY_WILDLIFE_ISSUES, wildlife_issues)
 
-        other_issues = app.ddb_cache.get(CKEY_OTHER_ISSUES)
-        if not other_issues:
-            other_issues = app.report.get_other_issue_list()
-            app.ddb_cache.put(CKEY_OTHER_ISSUES, other_issues)
+            other_issues = cached[CKEY_OTHER_ISSUES]
+            if not other_issues:
+                other_issues = app.report.get_other_issue_list()
+                app.ddb_cache.put(CKEY_OTHER_ISSUES, other_issues)
 
-        places = app.ddb_cache.get(CKEY_PLACES)
-        if not places:
-            places = app.report.get_places_list()
-            app.ddb_cache.put(CKEY_PLACES, places)
+            places = cached[CKEY_PLACES]
+            if not places:
+                places = app.report.get_places_list()
+                app.ddb_cache.put(CKEY_PLACES, places)
 
-    blocks = []
-    blocks.append(
-        input_block(
-            "wildlife_issues",
-            "Wildlife Disturbance",
-            multi_select_element("value", "Select one or more", wildlife_issues),
-            optional=True,
-        )
-    )
-    blocks.append(
-        input_block(
-            "other_issues",
-            "Other Disturbance",
-            multi_select_element("value", "Select one or more", other_issues),
-            optional=True,
-        )
-    )
-    blocks.append(
-        input_block(
-            "location",
-            "Trail/Location",
-            select_element("value", "Select one", places),
-        )
-    )
-    blocks.append(
-        input_block(
-            "cross_trail",
-            "Nearest Cross Trail",
-            select_element("value", "Select one", places),
-            optional=True,
-        )
-    )
-    """
-    blocks.append(
-        input_block(
-            "kiosk_called",
-            "Was Kiosk Called?",
-            select_element(
-                "value",
-                "Select Yes or No",
-                [("Yes", "yes"), ("No", "no")],
-                initial_option=("No", "no"),
-            ),
-        )
-    )
-    """
-    blocks.append(
-        input_block(
-            "details",
-            "Additional Details",
-            pt_input_element("value", "Any additional details", multiline=True),
-            optional=True,
-        )
-    )
-    view = {
-        "type": "modal",
-        "callback_id": TYPE_DISTURBANCE,
-        "title": {"type": "plain_text", "text": "Disturbance Report"},
-        "notify_on_close": True,
-        "private_metadata": state,
-        "submit": {"type": "plain_text", "text": "Create"},
-        "close": {"type": "plain_text", "text": "Cancel"},
-        "blocks": blocks,
-    }
+            rendered = render_disturbance_view(wildlife_issues, other_issues, places)
+            app.ddb_cache.put(CKEY_DISTURBANCE_VIEW, rendered)
 
+    view = splice_json(rendered["view"], private_metadata=state)
     try:
-        post("views.open", dict(trigger_id=trigger, view=view))
+        post_raw(
+            "views.open", splice_json("{}", trigger_id=trigger, view=RawJSON(view))
+        )
     except exc.SlackApiError as ex:
         if "expired" in repr(ex):
             logger.warning("Received trigger expired - ignoring")
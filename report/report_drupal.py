@@ -12,6 +12,7 @@ import logging
 import slack_api
 
 from constants import (
+    CKEY_IDENTITY,
     TYPE_TRAIL,
     TYPE_DISTURBANCE,
 )
@@ -54,11 +55,68 @@ class ReportModel:
         return cls.field_list() - internal
 
 
+def _normalize(value):
+    # For matching - ignore case and extra white space
+    if not value:
+        return None
+    return " ".join(value.split()).lower()
+
+
+class IdentityIndex:
+    """
+    Website users keyed by normalized email and normalized name so we can map
+    a slack profile to a website user without scanning every user.
+    """
+
+    def __init__(self, all_users):
+        self.by_email = {}
+        self.by_name = {}
+        for uuid, attributes in all_users.items():
+            email = _normalize(attributes.get("mail", None))
+            if email:
+                self.by_email.setdefault(email, (uuid, attributes))
+            name = _normalize(attributes.get("name", None))
+            if name:
+                self.by_name.setdefault(name, (uuid, attributes))
+
+    def match(self, slack_profile):
+        """Return (uuid, attributes) of matching website user or (None, None)"""
+        # Match email - since we are a small org - matching name also works
+        # sometimes.
+        email = _normalize(slack_profile.get("email", None))
+        if email and email in self.by_email:
+            return self.by_email[email]
+        name = _normalize(slack_profile.get("real_name_normalized", None))
+        if name and name in self.by_name:
+            return self.by_name[name]
+        return None, None
+
+    def match_slack_user(self, slack_profile):
+        """
+        Same as match - but only slack users with an email can match.
+        All slack to website mapping should go through this.
+        """
+        if not slack_profile or "email" not in slack_profile:
+            return None, None
+        return self.match(slack_profile)
+
+
 class Report:
-    def __init__(self, config, site):
+    def __init__(self, config, site, users=None, ddb_cache=None):
+        """
+        users is where we get the website user list from - normally a
+        UserDirectory (defaults to asking the site directly).
+        If ddb_cache is given, slack to website user mappings are kept there.
+        """
         self._config = config
         self._logger = logging.getLogger(__name__)
         self._site = site
+        self._users = users or site
+        self._ddb_cache = ddb_cache
+        self._identity_ttl = int(config.get("IDENTITY_TTL", 24 * 60 * 60))
+        self._identity_negative_ttl = int(config.get("IDENTITY_NEGATIVE_TTL", 60 * 60))
+        self._index = None
+        self._index_version = None
 
     def _initrm(self):
         dt = datetime.now(tz.tzutc())
@@ -149,20 +207,68 @@ class Report:
         places = self._site.get_taxonomy("places")
         return sorted((d["name"], d["id"]) for d in places)
 
+    def identity_index(self):
+        """Return IdentityIndex - rebuilt only when the user list changes."""
+        all_users = self._users.get_all_users()
+        version = (getattr(self._users, "version", None), id(all_users))
+        if self._index is None or version != self._index_version:
+            self._index = IdentityIndex(all_users)
+            self._index_version = version
+        return self._index
+
+    def _identity_ttl_for(self, uuid):
+        return self._identity_ttl if uuid else self._identity_negative_ttl
+
     def slack2plsnr(self, slack_user_id):
         # Attempt to map the slack_id to a registered plsnr web site user
         # Returns a tuple - (<drupal uuid for user>, <name>, <drupal uid e.g. 358))
-        all_users = self._site.get_all_users()
+        # Normally this is a single cache read (see prime_identities).
+        if not self._ddb_cache:
+            return self._slack2plsnr(slack_user_id)
+
+        ckey = CKEY_IDENTITY.format(slack_user_id)
+        ident = self._ddb_cache.get(ckey)
+        if ident:
+            return ident["uuid"], ident["name"], ident["uid"]
+
+        self._logger.info(f"Identity cache miss for {slack_user_id}")
+        uuid, name, uid = self._slack2plsnr(slack_user_id)
+        self._ddb_cache.put(
+            ckey,
+            {"uuid": uuid, "name": name, "uid": uid},
+            ttl=self._identity_ttl_for(uuid),
+        )
+        return uuid, name, uid
+
+    def prime_identities(self):
+        """Store mapping of each slack user to website user."""
+        whoswho, unmatched = self.whoswho()
+        # Matched and unmatched users expire at different times
+        by_ttl = {}
+        for slack_id, info in whoswho.items():
+            uuid = info.get("web_uuid", None)
+            items = by_ttl.setdefault(self._identity_ttl_for(uuid), {})
+            items[CKEY_IDENTITY.format(slack_id)] = {
+                "uuid": uuid,
+                "name": info.get("web_name", None),
+                "uid": info.get("web_id", None),
+            }
+        written = 0
+        for ttl, items in by_ttl.items():
+            written += self._ddb_cache.put_many(items, ttl=ttl, only_if_changed=True)
+        self._logger.info(
+            f"Primed {len(whoswho)} identities ({written} changed)"
+            f" - {len(unmatched)} unmatched"
+        )
+
+    def _slack2plsnr(self, slack_user_id):
+        index = self.identity_index()
 
         slack_user = slack_api.get("users.info", params={"user": slack_user_id})
-        for uuid, attributes in all_users.items():
-            slack_profile = slack_user["user"].get("profile", None)
-            if slack_profile and "email" in slack_profile:
-                if (attributes.get("mail", "1") == slack_profile.get("email", "2")) or (
-                    attributes.get("name", "3").lower()
-                    == slack_profile.get("real_name_normalized", "4").lower()
-                ):
-                    return uuid, attributes["name"], attributes["drupal_internal__uid"]
+        slack_profile = slack_user["user"].get("profile", None)
+        uuid, attributes = index.match_slack_user(slack_profile)
+        if uuid:
+            return uuid, attributes["name"], attributes["drupal_internal__uid"]
         return None, None, None
 
     def whoswho(self):
@@ -170,7 +276,8 @@ class Report:
         { "slack_id": {
             "slack_name": <name>,
             "web_name": <matched name>,
-            "web_id": <matched uid>
+            "web_id": <matched uid>,
+            "web_uuid": <matched uuid>
             },
         }
         and a list of slack users that didn't match
@@ -178,26 +285,19 @@ class Report:
         whoswho = {}
         unmatched = []
         all_slack_users = slack_api.get_all_users()
-        all_users = self._site.get_all_users()
+        index = self.identity_index()
 
         for su in all_slack_users:
             slack_profile = su.get("profile", None)
             if slack_profile:
                 info = {"slack_name": slack_profile["real_name"]}
-                # Match email - since we are a small org - matching name also works
-                # sometimes.
-                for _uuid, attributes in all_users.items():
-                    if (
-                        attributes.get("mail", "1") == slack_profile.get("email", "2")
-                    ) or (
-                        attributes.get("name", "3").lower()
-                        == slack_profile.get("real_name_normalized", "4").lower()
-                    ):
-                        info["web_name"] = attributes["name"]
-                        info["email"] = attributes["mail"]
-                        info["web_id"] = attributes["drupal_internal__uid"]
-                        break
-                if "web_name" not in info:
+                uuid, attributes = index.match_slack_user(slack_profile)
+                if attributes:
+                    info["web_uuid"] = uuid
+                    info["web_name"] = attributes["name"]
+                    info["email"] = attributes["mail"]
+                    info["web_id"] = attributes["drupal_internal__uid"]
+                else:
                     # Didn't find them.
                     unmatched.append((su["id"], slack_profile["real_name"]))
                 whoswho[su["id"]] = info
@@ -1,5 +1,7 @@
 # Copyright 2021-2022 by J. Christopher Wagner (jwag). All rights reserved.
 
+import hashlib
+import json
 import logging
 import re
 
@@ -7,27 +9,136 @@ from dateutil import parser as date_parser
 from dateutil import relativedelta
 from dateutil import tz
 
+from constants import CKEY_ACTIVITY_CONFIG
 from drupal_api import DrupalApi
 
 
+class Presentation:
+    """
+    How to present ('what' and 'where') scheduled activities of one activity type.
+    Worked out once from the activity views and types - so presenting an
+    activity is just a format call.
+    """
+
+    def __init__(self, views, type_name, atype):
+        self._atype_name = atype["name"] if atype else None
+        self._what_format = None
+        self._what = "unk"
+        self._where_field = None
+        self._custom = [{}, {}]
+        if atype:
+            for n in range(2):
+                options = atype["custom_fields"][n]["options"] or []
+                self._custom[n] = {o["key"]: o["name"] for o in options}
+
+        # look at activity view to figure out what field is 'what'/'where'
+        # Simplification - assume different views don't have same activity type
+        # with different 'what' fields.
+        for view in views.values():
+            what = view["activity_types"].get(type_name, {}).get("what", None)
+            if what:
+                if what["week_entry"]["enabled"]:
+                    markup = what["week_entry"]["markup"]
+                elif what["month_entry"]["enabled"]:
+                    markup = what["month_entry"]["markup"]
+                else:
+                    # 'what' not in view for this activity type - default to name
+                    markup = None
+                    self._what = self._atype_name or "unk"
+                if markup and atype:
+                    # support @title, @custom1, @custom2, @activity_type
+                    # Convert drupal style markup to python format style
+                    self._what_format = re.sub(r"@([a-zA-Z_0-9]+)", r"{\1}", markup)
+                break
+
+        for view in views.values():
+            where = view["activity_types"].get(type_name, {}).get("where", None)
+            if where:
+                if where["week_entry"]["enabled"]:
+                    self._where_field = where["week_entry"]["sa_field_name"]
+                elif where["month_entry"]["enabled"]:
+                    self._where_field = where["month_entry"]["sa_field_name"]
+                if self._where_field:
+                    break
+
+    def what(self, sa_attributes):
+        if not self._what_format:
+            return self._what
+        return self._what_format.format(
+            title=sa_attributes["title"],
+            activity_type=self._atype_name,
+            custom1=self._custom[0].get(sa_attributes["custom1"], None),
+            custom2=self._custom[1].get(sa_attributes["custom2"], None),
+        )
+
+    def where(self, sa_attributes):
+        if self._where_field == "custom1":
+            return self._custom[0].get(sa_attributes["custom1"], None) or "unk"
+        if self._where_field == "custom2":
+            return self._custom[1].get(sa_attributes["custom2"], None) or "unk"
+        return "unk"
+
+
+UNKNOWN_PRESENTATION = Presentation({}, None, None)
+
+
+def config_hash(views, types):
+    return hashlib.sha1(json.dumps([views, types], sort_keys=True).encode()).hexdigest()
+
+
 class ScheduledActivity:
-    def __init__(self, config, site: DrupalApi):
+    def __init__(self, config, site: DrupalApi, ddb_cache=None):
+        """
+        If ddb_cache is given the activity views/types are kept there
+        (see refresh_activity_config).
+        """
         self._config = config
         self._logger = logging.getLogger(__name__)
         self._site = site
+        self._ddb_cache = ddb_cache
+        self._presentations = None
+        self._presentations_version = None
+
+    def presentations(self, views, types, version=None):
+        """
+        Return dict of {activity_type: Presentation}.
+        Only rebuilt when views/types change (version is a hash of them).
+        """
+        if not version:
+            version = config_hash(views, types)
+        if version != self._presentations_version:
+            names = set(types.keys())
+            for view in views.values():
+                names.update(view["activity_types"].keys())
+            self._presentations = {
+                name: Presentation(views, name, types.get(name, None)) for name in names
+            }
+            self._presentations_version = version
+        return self._presentations
 
-    @staticmethod
-    def get_custom_fields(atype, sa_attributes):
-        custom1 = custom2 = None
-        options = atype["custom_fields"][0]["options"] or []
-        for option in options:
-            if option["key"] == sa_attributes["custom1"]:
-                custom1 = option["name"]
-        options = atype["custom_fields"][1]["options"] or []
-        for option in options:
-            if option["key"] == sa_attributes["custom2"]:
-                custom2 = option["name"]
-        return custom1, custom2
+    def refresh_activity_config(self):
+        """
+        Fetch activity views and types from the website and store in the cache.
+        These change only a few times a season - so this is done by
+        tasks.prime_cache and whoat never has to fetch them.
+        Returns {"hash": <hash>, "views": {}, "types": {}}
+        """
+        views = self._site.get_activity_views()
+        types = self._site.get_activity_types()
+        aconfig = {"hash": config_hash(views, types), "views": views, "types": types}
+        if self._ddb_cache:
+            self._ddb_cache.put(CKEY_ACTIVITY_CONFIG, aconfig)
+        return aconfig
+
+    def get_activity_config(self):
+        """Return cached activity views and types (see refresh_activity_config)."""
+        aconfig = None
+        if self._ddb_cache:
+            aconfig = self._ddb_cache.get(CKEY_ACTIVITY_CONFIG)
+        if not aconfig:
+            self._logger.warning("APP: No cached activity config - fetching")
+            aconfig = self.refresh_activity_config()
+        return aconfig
 
     def whoat(self, when, which):
         """
@@ -47,10 +158,25 @@ class ScheduledActivity:
         <header2>: []
         }
         """
+        return self.whoat_range(when, 1, which)[when]
 
-        rawdt = date_parser.parse(when)
-        dt = rawdt.replace(tzinfo=tz.gettz("America/Los Angeles")).astimezone(tz.UTC)
-        self._logger.info(f"APP: whoat: which: {which} when: {dt.isoformat()}")
+    def whoat_range(self, start, days, which):
+        """
+        Same as whoat - but for 'days' days starting at 'start' (format: 20191001)
+        using a single fetch of activities and signups.
+
+        Returns dict of {<YYYYMMDD>: <atinfo as returned by whoat>}
+        """
+        ltz = tz.gettz("America/Los_Angeles")
+        lstart = date_parser.parse(start).replace(tzinfo=ltz)
+        # Local midnights - the UTC offset of each is figured out separately so
+        # a window that crosses a DST change still ends at local midnight.
+        ldays = [lstart + relativedelta.relativedelta(days=n) for n in range(days)]
+        lend = lstart + relativedelta.relativedelta(days=days)
+        dt = lstart.astimezone(tz.UTC)
+        self._logger.info(
+            f"APP: whoat: which: {which} when: {dt.isoformat()} days: {days}"
+        )
 
         filters = {
             "filter[from][condition][path]": "start_time",
@@ -58,9 +184,7 @@ class ScheduledActivity:
             "filter[from][condition][value]": dt.isoformat(),
             "filter[to][condition][path]": "start_time",
             "filter[to][condition][operator]": "<",
-            "filter[to][condition][value]": (
-                dt + relativedelta.relativedelta(days=1)
-            ).isoformat(),
+            "filter[to][condition][value]": lend.astimezone(tz.UTC).isoformat(),
         }
         if which != "all":
             filters.update({"filter[activity_type]": which})
@@ -70,14 +194,35 @@ class ScheduledActivity:
         self._logger.debug(f"APP: whoat: fetch from site: params: {filters}")
 
         results = self._site.simple_get(
-            "/scheduled_activity/scheduled_activity", params=filters
+            "/scheduled_activity/scheduled_activity", params=filters, parallel=True
+        )
+        aconfig = self.get_activity_config()
+        presentations = self.presentations(
+            aconfig["views"], aconfig["types"], aconfig["hash"]
         )
-        views = self._site.get_activity_views()
-        types = self._site.get_activity_types()
 
         # fetch all signups for all activities
         signups = self.get_signups(results)
+        # and everyone involved
+        names = self.get_names(results, signups)
+
+        # split by local day
+        by_day = {lday.strftime("%Y%m%d"): [] for lday in ldays}
+        for r in results:
+            lday = (
+                date_parser.parse(r["attributes"]["start_time"])
+                .astimezone(ltz)
+                .strftime("%Y%m%d")
+            )
+            if lday in by_day:
+                by_day[lday].append(r)
+
+        return {
+            lday: self._atinfo(day_results, presentations, signups, names)
+            for lday, day_results in by_day.items()
+        }
 
+    def _atinfo(self, results, presentations, signups, names):
         atinfo = {}
         for r in results:
             rels = r["relationships"]
@@ -92,22 +237,21 @@ class ScheduledActivity:
             who = []
             presenter = rels["presenter"]["data"]
             if presenter:
-                who.append(self._site.get_user(presenter["id"])["attributes"]["name"])
+                who.append(names[presenter["id"]])
             sid = r["attributes"]["drupal_internal__id"]
             if sid in signups:
                 for user in signups[sid]:
-                    who.append(self._site.get_user(user)["attributes"]["name"])
+                    who.append(names[user])
 
             # This is 'whoat' - if no who then don't add to return dict
             if who:
-                title = self.find_what(
-                    r, views, types.get(r["attributes"]["activity_type"], None)
+                presentation = presentations.get(
+                    r["attributes"]["activity_type"], UNKNOWN_PRESENTATION
                 )
+                title = presentation.what(r["attributes"])
                 if title not in atinfo:
                     atinfo[title] = []
-                where = self.find_where(
-                    r, views, types.get(r["attributes"]["activity_type"], None)
-                )
+                where = presentation.where(r["attributes"])
                 atinfo[title].append(dict(who=who, time=when, where=where))
         if not atinfo:
             atinfo["Oh no!"] = [dict(who=["No one"], time="all day")]
@@ -116,95 +260,35 @@ class ScheduledActivity:
         self._logger.info(f"APP: whoat: atinfo counts:{entries_per_title}")
         return atinfo
 
-    def find_what(self, sa, views, atype):
-        # look at activity view to figure out what field is 'what'
-        # Simplification - assume different views don't have same activity type
-        # with different 'what' fields.
-        what_value = "unk"
-        for view in views.values():
-            sa_atype = sa["attributes"]["activity_type"]
-            if sa_atype in view["activity_types"]:
-                what = view["activity_types"][sa_atype].get("what", None)
-                if what:
-                    if what["week_entry"]["enabled"]:
-                        markup = what["week_entry"]["markup"]
-                    elif what["month_entry"]["enabled"]:
-                        markup = what["month_entry"]["markup"]
-                    else:
-                        # 'what' not in view for this activity type - default to name
-                        return atype["name"]
-                    what_value = self.find_what_value(
-                        markup,
-                        sa["attributes"],
-                        atype,
-                    )
-                    return what_value
-        return what_value
-
-    def find_where(self, sa, views, atype):
-        # look at activity view to figure out what field is 'what'
-        # Simplification - assume different views don't have same activity type
-        # with different 'what' fields.
-        where_value = "unk"
-        field_name = None
-        for view in views.values():
-            sa_atype = sa["attributes"]["activity_type"]
-            if sa_atype in view["activity_types"]:
-                where = view["activity_types"][sa_atype].get("where", None)
-                if where:
-                    if where["week_entry"]["enabled"]:
-                        field_name = where["week_entry"]["sa_field_name"]
-                    elif where["month_entry"]["enabled"]:
-                        field_name = where["month_entry"]["sa_field_name"]
-
-                    if field_name:
-                        where_value = self.find_where_value(
-                            field_name,
-                            sa["attributes"],
-                            atype,
-                        )
-                        return where_value
-        return where_value
-
-    def find_where_value(self, field_name, sa_attributes, atype):
-        # self._logger.info(f"find where value {field_name} {field_value} {atype}")
-        if not atype:
-            return "unk"
-        custom1, custom2 = ScheduledActivity.get_custom_fields(atype, sa_attributes)
-        if field_name == "custom1" and custom1:
-            return custom1
-        if field_name == "custom2" and custom2:
-            return custom2
-        return "unk"
+    def get_names(self, results, signups):
+        # Return dict of {user uuid: name} for all presenters and signups
+        uuids = []
+        for r in results:
+            presenter = r["relationships"]["presenter"]["data"]
+            if presenter:
+                uuids.append(presenter["id"])
+        for users in signups.values():
+            uuids.extend(users)
 
-    def find_what_value(self, markup, sa_attributes, atype):
-        # self._logger.info(f"find what value markup: {markup} {sa_attributes} {atype}")
-        if not atype:
-            return "unk"
-        # support @title, @custom1, @custom2, @activity_type
-        # Convert drupal style markup to python format style
-        fmarkup = re.sub(r"@([a-zA-Z_0-9]+)", r"{\1}", markup)
-        title = sa_attributes["title"]
-        activity_type = atype["name"]
-        custom1, custom2 = ScheduledActivity.get_custom_fields(atype, sa_attributes)
-        return fmarkup.format(
-            title=title, activity_type=activity_type, custom1=custom1, custom2=custom2
-        )
+        names = {
+            uuid: attributes["name"]
+            for uuid, attributes in self._site.get_users(uuids, fields=["name"]).items()
+        }
+        for uuid in set(uuids) - names.keys():
+            # Shouldn't happen - but fall back to asking one at a time.
+            names[uuid] = self._site.get_user(uuid)["attributes"]["name"]
+        return names
 
     def get_signups(self, results):
         # for each activity get all signups and return dict of
         # {activity_id: [list of UID]
-        filters = {
-            "filter[s][condition][path]": "activity_id",
-            "filter[s][condition][operator]": "IN",
-            "filter[s][condition][value]": {},
-        }
-        for r in results:
-            sid = r["attributes"]["drupal_internal__id"]
-            filters[f"filter[s][condition][value][{sid}]"] = sid
-
-        signups = self._site.simple_get(
-            "/scheduled_activity_signups/scheduled_activity_signups", params=filters
+        sids = [r["attributes"]["drupal_internal__id"] for r in results]
+        signups = self._site.get_in(
+            "/scheduled_activity_signups/scheduled_activity_signups",
+            "activity_id",
+            sids,
+            chunk_size=int(self._config.get("SIGNUP_CHUNK_SIZE", 50)),
+            max_workers=int(self._config.get("SIGNUP_CONCURRENCY", 4)),
         )
         results = {}
         for s in signups:
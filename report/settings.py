@@ -4,15 +4,55 @@
 class Settings:
     USE_DYNAMO = True
     ENABLE_TRAIL_REPORT = False
+    # Change to re-publish everyone's Home tab (e.g. when it looks different).
+    HOME_PUBLISH_EPOCH = 0
+    # Seconds before we re-publish an unchanged Home tab anyway.
+    HOME_PUBLISH_TTL = 7 * 24 * 60 * 60
 
     PLSNR_USERNAME = None
     PLSNR_PASSWORD = None
 
     SSL_VERIFY = True
+    # Max concurrent requests to the website when fetching pages in parallel.
+    PLSNR_MAX_WORKERS = 4
+    # Activity ids per signup request and how many requests at once.
+    SIGNUP_CHUNK_SIZE = 50
+    SIGNUP_CONCURRENCY = 4
+    # Conditional GET cache for website requests: None, memory, file or ddb
+    PLSNR_HTTP_CACHE = "memory"
+    PLSNR_HTTP_CACHE_DIR = "/tmp/plsnr-http"
+    # Bound on response bodies kept in memory.
+    PLSNR_HTTP_CACHE_MAX_BYTES = 16 * 1024 * 1024
+    # Seconds before stored (ddb) responses expire.
+    PLSNR_HTTP_CACHE_TTL = 2 * 24 * 60 * 60
+    # Seconds between looking for changed website users / reloading all of them.
+    USER_SYNC_INTERVAL = 90 * 60
+    USER_FULL_SYNC_INTERVAL = 7 * 24 * 60 * 60
+    # Seconds to remember slack user to website user mappings (and misses).
+    IDENTITY_TTL = 24 * 60 * 60
+    IDENTITY_NEGATIVE_TTL = 60 * 60
+
+    # Local tiers in front of the DDB cache (size 0/no dir to disable)
+    CACHE_L1_SIZE = 256
+    CACHE_L1_TTL = 60
+    CACHE_L2_DIR = None
+    CACHE_L2_TTL = 300
+    # Store cache values at least this long (bytes of JSON) compressed.
+    CACHE_COMPRESS_THRESHOLD = None
+    # Seconds to keep each day's primed 'at' info (None to keep forever).
+    CACHE_AT_TTL = 2 * 24 * 60 * 60
+
+    # Only used when EV_MODE = "pool" (local)
+    EV_POOL_WORKERS = 4
+    EV_POOL_QUEUE_SIZE = 32
+    EV_POOL_REJECT_POLICY = "reject"  # reject, caller_runs, block
+    EV_POOL_BLOCK_TIMEOUT = 1.0
+    # Seconds a lower priority task can wait before it jumps the queue.
+    EV_POOL_MAX_WAIT = 2.0
 
 
 class DevSettings(Settings):
-    EV_MODE = "ev"
+    EV_MODE = "ev"  # or "pool"
 
     AWS_PROFILE = "plsnr"
 
@@ -28,6 +68,8 @@ class DevSettings(Settings):
 class AWSDevSettings(Settings):
     EV_MODE = "zappa"
 
+    CACHE_L2_DIR = "/tmp/plsnr-cache"
+
     DYNAMO_TABLE_SUFFIX = "-test"
 
     PLSNR_HOST = "https://devd10-2g4wgvy-mhab7wjgx42wa.us-3.platformsh.site"
@@ -36,6 +78,8 @@ class AWSDevSettings(Settings):
 class AWSProdSettings(Settings):
     EV_MODE = "zappa"
 
+    CACHE_L2_DIR = "/tmp/plsnr-cache"
+
     DYNAMO_TABLE_SUFFIX = "-live"
 
     PLSNR_HOST = "https://docents.plsnr.org"
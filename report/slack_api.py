@@ -5,15 +5,75 @@ import os
 
 import cachetools.func
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from exc import SlackApiError
 
 SLACK_URL = "https://www.slack.com/api/"
 BOT_USER_ID = ""
 
+# (connect, read) timeout in seconds - views.open has to beat the 3 second
+# trigger_id window so don't let a single call hang around.
+DEFAULT_TIMEOUT = (3.05, 10)
+POOL_SIZE = 10
+# Retry budget - only applies to idempotent (GET) calls and connection failures.
+RETRIES = 2
+
 logger = logging.getLogger(__name__)
 
 
+def _new_session(pool_size=POOL_SIZE, retries=RETRIES):
+    """
+    A single keep-alive session shared by all slack calls so we only pay for
+    the TCP+TLS handshake once per warm process.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "HEAD"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = _new_session()
+
+
+def configure(pool_size=POOL_SIZE, retries=RETRIES):
+    """Replace the pooled session (e.g. to change pool size or retry budget)."""
+    global _session
+    old = _session
+    _session = _new_session(pool_size, retries)
+    old.close()
+
+
+def connection_stats():
+    """
+    Return how many connections were opened versus reused across all pooled
+    hosts (slack.com, hooks.slack.com for response_urls).
+    """
+    opened = requests_made = 0
+    for adapter in {id(a): a for a in _session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool:
+                opened += pool.num_connections
+                requests_made += pool.num_requests
+    return {
+        "requests": requests_made,
+        "opened": opened,
+        "reused": max(requests_made - opened, 0),
+    }
+
+
 def _chk_error(rv, endpoint):
     try:
         jresponse = rv.json()
@@ -32,7 +92,7 @@ def _chk_error(rv, endpoint):
     return jresponse
 
 
-def post(endpoint, payload, auth=None):
+def _post(endpoint, auth, timeout, **kwargs):
     if not auth:
         auth = os.environ["BOT_TOKEN"]
     headers = {
@@ -41,39 +101,66 @@ def post(endpoint, payload, auth=None):
         "Accept": "application/json",
     }
     try:
-        rv = requests.post(SLACK_URL + "/" + endpoint, headers=headers, json=payload)
-    except Exception as exc:
-        logger.error("POST failed", exc)
-        return None
+        rv = _session.post(
+            SLACK_URL + "/" + endpoint, headers=headers, timeout=timeout, **kwargs
+        )
+    except requests.RequestException as exc:
+        # e.g. timeout - callers handle slack errors the same way
+        logger.exception("POST to %s failed", endpoint)
+        raise SlackApiError(f"Endpoint {endpoint} POST failed: {exc!r}") from exc
     return _chk_error(rv, endpoint)
 
 
-def get(endpoint, params=None):
+def post(endpoint, payload, auth=None, timeout=DEFAULT_TIMEOUT):
+    return _post(endpoint, auth, timeout, json=payload)
+
+
+def post_raw(endpoint, body, auth=None, timeout=DEFAULT_TIMEOUT):
+    """Same as post - but body is already serialized JSON (str or bytes)."""
+    if isinstance(body, str):
+        body = body.encode()
+    return _post(endpoint, auth, timeout, data=body)
+
+
+def get(endpoint, params=None, timeout=DEFAULT_TIMEOUT):
     headers = {
         "Authorization": "Bearer {}".format(os.environ["BOT_TOKEN"]),
         "Content-Type": "application/json;charset=utf-8",
         "Accept": "application/json",
     }
-    rv = requests.get(SLACK_URL + "/" + endpoint, headers=headers, params=params)
+    rv = _session.get(
+        SLACK_URL + "/" + endpoint, headers=headers, params=params, timeout=timeout
+    )
     rv.raise_for_status()
     return rv.json()
 
 
-def get_file_info(fid):
+def get_file_info(fid, timeout=DEFAULT_TIMEOUT):
     headers = {"Authorization": "Bearer {}".format(os.environ["BOT_TOKEN"])}
-    rv = requests.get(SLACK_URL + "/files.info", headers=headers, params={"file": fid})
+    rv = _session.get(
+        SLACK_URL + "/files.info",
+        headers=headers,
+        params={"file": fid},
+        timeout=timeout,
+    )
     rv.raise_for_status()
     return rv.json()
 
 
-def send_update(response_url, text, replace_original=False, delete_original=False):
+def send_update(
+    response_url,
+    text,
+    replace_original=False,
+    delete_original=False,
+    timeout=DEFAULT_TIMEOUT,
+):
     payload = {
         "text": text,
         "response_type": "ephemeral",
         "replace_original": replace_original,
         "delete_original": delete_original,
     }
-    rv = requests.post(response_url, json=payload)
+    rv = _session.post(response_url, json=payload, timeout=timeout)
     _chk_error(rv, response_url)
 
 
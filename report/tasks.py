@@ -16,6 +16,7 @@ import os
 
 from constants import (
     LOG_FORMAT,
+    CKEY_DISTURBANCE_VIEW,
     CKEY_OTHER_ISSUES,
     CKEY_PLACES,
     CKEY_WILDLIFE_ISSUES,
@@ -23,8 +24,10 @@ from constants import (
 )
 from drupal_api import DrupalApi
 import dynamo
+import http_cache
 import report_drupal
 from scheduled_activity import ScheduledActivity
+from user_directory import UserDirectory
 import utils
 
 
@@ -57,19 +60,38 @@ def prime_cache_internal(config, ddb_cache, which_days):
         config["PLSNR_PASSWORD"],
         "{}/plsnr1933api".format(config["PLSNR_HOST"]),
         config["SSL_VERIFY"],
+        int(config["PLSNR_MAX_WORKERS"]),
+        http_cache.from_config(config, ddb_cache),
     )
-    report = report_drupal.Report(config, site)
-    sa = ScheduledActivity(config, site)
+    users = UserDirectory(config, site, ddb_cache)
+    report = report_drupal.Report(config, site, users, ddb_cache)
+    sa = ScheduledActivity(config, site, ddb_cache)
+    sa.refresh_activity_config()
 
     where = "all"
-    for day in which_days:
-        lday, ckey = utils.at_cache_helper(day, where)
-        atinfo = sa.whoat(lday.strftime("%Y%m%d"), where)
-        ddb_cache.put(ckey, atinfo)
-
-    ddb_cache.put(CKEY_PLACES, report.get_places_list())
-    ddb_cache.put(CKEY_WILDLIFE_ISSUES, report.get_wildlife_issue_list())
-    ddb_cache.put(CKEY_OTHER_ISSUES, report.get_other_issue_list())
+    # Fetch all the days at once
+    ldays = [utils.at_cache_helper(day, where) for day in which_days]
+    first = min(lday for lday, _ in ldays)
+    ndays = (max(lday for lday, _ in ldays).date() - first.date()).days + 1
+    atinfos = sa.whoat_range(first.strftime("%Y%m%d"), ndays, where)
+    items = {}
+    for lday, ckey in ldays:
+        items[ckey] = atinfos[lday.strftime("%Y%m%d")]
+        items[utils.render_ckey(ckey)] = utils.render_at(items[ckey], lday)
+    at_ttl = config.get("CACHE_AT_TTL", None)
+    ddb_cache.put_many(items, ttl=int(at_ttl) if at_ttl else None, only_if_changed=True)
+
+    items = {
+        CKEY_PLACES: report.get_places_list(),
+        CKEY_WILDLIFE_ISSUES: report.get_wildlife_issue_list(),
+        CKEY_OTHER_ISSUES: report.get_other_issue_list(),
+    }
+    items[CKEY_DISTURBANCE_VIEW] = utils.render_disturbance_view(
+        items[CKEY_WILDLIFE_ISSUES], items[CKEY_OTHER_ISSUES], items[CKEY_PLACES]
+    )
+    ddb_cache.put_many(items, only_if_changed=True)
+    users.sync()
+    report.prime_identities()
 
 
 def prime_cache():
@@ -106,9 +128,23 @@ def backup():
         logger.info(f"Backup response for table {table}: {rv}")
 
 
+def prune():
+    """
+    Delete expired cache items.
+    DynamoDB does this on its own - this is for local DynamoDB.
+    """
+    config = _setup()
+    logger.info("prune: init db")
+    ddb = dynamo.DDB(config)
+    dynamo.DDBCache(config, ddb).prune()
+
+
 def parseargs():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument("--date", help="example: 01/23/2019.")
+    arg_parser.add_argument(
+        "--prune", action="store_true", help="delete expired cache items first."
+    )
     return arg_parser.parse_args()
 
 
@@ -118,6 +154,8 @@ if __name__ == "__main__":
     gddb = dynamo.DDB(config)
     gddb.create_all()
     gddb_cache = dynamo.DDBCache(config, gddb)
+    if _args.prune:
+        gddb_cache.prune()
 
     if _args.date:
         fday = parser.parse(_args.date)
@@ -0,0 +1,108 @@
+# Copyright 2024 by J. Christopher Wagner (jwag). All rights reserved.
+
+"""
+A copy of the website's user list kept in the DDB cache.
+
+Rather than downloading all users on every cold start, we keep a snapshot
+plus a high-water mark (the latest 'changed' timestamp seen) and only ask the
+website for users changed since then. tasks.prime_cache keeps the snapshot
+fresh - so normally a report submission doesn't talk to the website at all.
+"""
+
+import logging
+import threading
+import time
+
+from dateutil import parser as date_parser
+
+from constants import CKEY_USERS
+from drupal_api import DrupalApi
+from dynamo import DDBCache
+
+# The only attributes we use - keeps the snapshot well under the DDB item limit.
+USER_FIELDS = ["name", "mail", "drupal_internal__uid", "changed"]
+
+
+class UserDirectory:
+    def __init__(self, config, site: DrupalApi, ddb_cache: DDBCache):
+        self._config = config
+        self._logger = logging.getLogger(__name__)
+        self._site = site
+        self._ddb_cache = ddb_cache
+        # Seconds before we look for changed users.
+        self._sync_interval = int(config.get("USER_SYNC_INTERVAL", 90 * 60))
+        # Deleted users are only noticed with a full sync.
+        self._full_sync_interval = int(
+            config.get("USER_FULL_SYNC_INTERVAL", 7 * 24 * 60 * 60)
+        )
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    @property
+    def version(self):
+        """Changes whenever the user list does."""
+        if not self._snapshot:
+            return None
+        return (
+            self._snapshot["full_synced"],
+            self._snapshot["hwm"],
+            len(self._snapshot["users"]),
+        )
+
+    def get_all_users(self):
+        """Same as DrupalApi.get_all_users (but only USER_FIELDS attributes)."""
+        with self._lock:
+            now = time.time()
+            if not self._snapshot or now - self._snapshot["synced"] > (
+                self._sync_interval
+            ):
+                # Maybe someone else (prime_cache) has already synced
+                self._snapshot = self._ddb_cache.get(CKEY_USERS)
+            if (
+                not self._snapshot
+                or now - self._snapshot["full_synced"] > self._full_sync_interval
+            ):
+                self._sync(full=True)
+            elif now - self._snapshot["synced"] > self._sync_interval:
+                self._sync(full=False)
+            return self._snapshot["users"]
+
+    def sync(self, full=False):
+        """Bring snapshot up to date with website - returns # of changed users."""
+        with self._lock:
+            if not full and not self._snapshot:
+                self._snapshot = self._ddb_cache.get(CKEY_USERS)
+            if (
+                not self._snapshot
+                or time.time() - self._snapshot["full_synced"]
+                > self._full_sync_interval
+            ):
+                full = True
+            return self._sync(full=full)
+
+    def _sync(self, full):
+        now = time.time()
+        if full:
+            snapshot = {"users": {}, "hwm": 0, "full_synced": now}
+        else:
+            snapshot = self._snapshot
+        # Include users changed in the same second as hwm - we may not have
+        # seen all of them (the merge below doesn't mind seeing them again).
+        changed = self._site.get_users_changed_since(
+            snapshot["hwm"], fields=USER_FIELDS
+        )
+
+        snapshot["users"].update(changed)
+        for attributes in changed.values():
+            if attributes.get("changed", None):
+                changed_ts = date_parser.parse(attributes["changed"]).timestamp()
+                snapshot["hwm"] = max(snapshot["hwm"], int(changed_ts))
+        snapshot["synced"] = now
+        self._logger.info(
+            "APP: users sync: full: {} changed: {} total: {}".format(
+                full, len(changed), len(snapshot["users"])
+            )
+        )
+        self._ddb_cache.put(CKEY_USERS, snapshot)
+        self._snapshot = snapshot
+        return len(changed)
@@ -2,8 +2,17 @@
 
 from dateutil import tz
 import datetime
+import hashlib
+import itertools
+import json
 import re
 
+from constants import TYPE_DISTURBANCE
+
+# Bump whenever a pre-rendered view changes (e.g. atinfo_to_blocks) - so
+# payloads (see render_at) rendered before the change are ignored.
+RENDER_VERSION = 1
+
 
 def text_block(text):
     b = {"type": "section", "text": {"type": "mrkdwn", "text": text}}
@@ -143,6 +152,161 @@ def at_cache_helper(which_day: datetime.datetime, where):
     return lday, ckey
 
 
+def at_view(blocks):
+    return {
+        "type": "modal",
+        "title": {"type": "plain_text", "text": "Who's at the Reserve"},
+        "notify_on_close": False,
+        "blocks": blocks,
+    }
+
+
+def render_ckey(ckey):
+    """Cache key of the pre-rendered payloads for 'at' cache key ckey."""
+    return f"render:{ckey}"
+
+
+def render_at(atinfo, lday: datetime.datetime):
+    """
+    Pre-render the 'at' modal view and message blocks as serialized JSON -
+    so handlers can send them as is (see splice_json).
+    """
+    blocks = atinfo_to_blocks(atinfo, lday)
+    return {
+        "version": RENDER_VERSION,
+        "view": json.dumps(at_view(blocks)),
+        "blocks": json.dumps(blocks),
+    }
+
+
+def render_disturbance_view(wildlife_issues, other_issues, places):
+    """
+    Pre-render (serialize) the disturbance modal - less private_metadata.
+    Stored (CKEY_DISTURBANCE_VIEW) whenever the lists are primed.
+    """
+    return {
+        "version": RENDER_VERSION,
+        "view": json.dumps(_disturbance_view(wildlife_issues, other_issues, places)),
+    }
+
+
+def _disturbance_view(wildlife_issues, other_issues, places):
+    blocks = []
+    blocks.append(
+        input_block(
+            "wildlife_issues",
+            "Wildlife Disturbance",
+            multi_select_element("value", "Select one or more", wildlife_issues),
+            optional=True,
+        )
+    )
+    blocks.append(
+        input_block(
+            "other_issues",
+            "Other Disturbance",
+            multi_select_element("value", "Select one or more", other_issues),
+            optional=True,
+        )
+    )
+    blocks.append(
+        input_block(
+            "location",
+            "Trail/Location",
+            select_element("value", "Select one", places),
+        )
+    )
+    blocks.append(
+        input_block(
+            "cross_trail",
+            "Nearest Cross Trail",
+            select_element("value", "Select one", places),
+            optional=True,
+        )
+    )
+    """
+    blocks.append(
+        input_block(
+            "kiosk_called",
+            "Was Kiosk Called?",
+            select_element(
+                "value",
+                "Select Yes or No",
+                [("Yes", "yes"), ("No", "no")],
+                initial_option=("No", "no"),
+            ),
+        )
+    )
+    """
+    blocks.append(
+        input_block(
+            "details",
+            "Additional Details",
+            pt_input_element("value", "Any additional details", multiline=True),
+            optional=True,
+        )
+    )
+    view = {
+        "type": "modal",
+        "callback_id": TYPE_DISTURBANCE,
+        "title": {"type": "plain_text", "text": "Disturbance Report"},
+        "notify_on_close": True,
+        "submit": {"type": "plain_text", "text": "Create"},
+        "close": {"type": "plain_text", "text": "Cancel"},
+        "blocks": blocks,
+    }
+    return view
+
+
+def current_render(rendered):
+    """Return rendered (from render_at) unless missing or outdated."""
+    if rendered and rendered.get("version", None) == RENDER_VERSION:
+        return rendered
+    return None
+
+
+class RawJSON(str):
+    """Already serialized JSON - splice_json inserts it as is."""
+
+
+def splice_json(obj_json, **fields):
+    """
+    Add fields to the serialized JSON object obj_json without parsing it.
+    Values are serialized - except RawJSON ones.
+    The fields must not already be in obj_json.
+    """
+    if not fields:
+        return obj_json
+    added = ", ".join(
+        "{}: {}".format(json.dumps(k), v if isinstance(v, RawJSON) else json.dumps(v))
+        for k, v in fields.items()
+    )
+    rest = obj_json.strip()[1:].lstrip()
+    return "{" + added + ("" if rest.startswith("}") else ", ") + rest
+
+
+class ViewTemplate:
+    """
+    A static view serialized once (e.g. at import time) - only the per request
+    fields (e.g. private_metadata) are spliced in by render().
+    """
+
+    def __init__(self, view):
+        self._json = json.dumps(view)
+        # Changes whenever the view does.
+        self.digest = hashlib.sha256(self._json.encode()).hexdigest()
+
+    def render(self, **fields):
+        """Return the serialized view (with fields added)."""
+        return RawJSON(splice_json(self._json, **fields))
+
+
+def chunks(items, size):
+    """Yield lists of at most size items."""
+    it = iter(items)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
 def convert_gps(gps):
     """Parse iphone compass app GPS coordinates: '36°33′0″ N  121°55′28″ W'"""
     # 2 spaces between lat/lng
@@ -0,0 +1,69 @@
+import time
+
+import dynamo
+
+
+def _stored(ddb, ckey):
+    return ddb.client.get_item(
+        TableName=dynamo.TN_LOOKUP["cache"], Key={"ckey": {"S": ckey}}
+    )["Item"]
+
+
+def test_put_unchanged_skipped(ddb):
+    cache = dynamo.DDBCache({}, ddb)
+    assert cache.put("k", {"a": 1})
+    assert not cache.put("k", {"a": 1})
+    assert cache.put("k", {"a": 2})
+    assert cache.get("k") == {"a": 2}
+    assert cache.put("k", {"a": 3}, only_if_changed=False)
+    assert not cache.put("k", {"a": 3}, only_if_changed=False)
+
+
+def test_put_ttl_added_to_unchanged(ddb):
+    # An item written without an expiry gets one when re-put with a ttl.
+    cache = dynamo.DDBCache({}, ddb)
+    assert cache.put("k", {"a": 1})
+    assert dynamo.TTL_ATTRIBUTE not in _stored(ddb, "k")
+
+    # Written - but the value didn't change.
+    assert not cache.put("k", {"a": 1}, ttl=100)
+    expires = int(_stored(ddb, "k")[dynamo.TTL_ATTRIBUTE]["N"])
+    assert time.time() < expires <= time.time() + 100
+
+    # Still fresh - nothing to do.
+    assert not cache.put("k", {"a": 1}, ttl=100)
+
+
+def test_put_no_ttl_removes_expiry(ddb):
+    # Same value without a ttl means keep forever.
+    cache = dynamo.DDBCache({}, ddb)
+    assert cache.put("k", {"a": 1}, ttl=100)
+    assert not cache.put("k", {"a": 1})
+    assert dynamo.TTL_ATTRIBUTE not in _stored(ddb, "k")
+    assert not cache.put("k", {"a": 1})
+
+    # put_many agrees
+    cache.put_many({"m": 1}, ttl=100)
+    assert cache.put_many({"m": 1}, only_if_changed=True) == 1
+    assert dynamo.TTL_ATTRIBUTE not in _stored(ddb, "m")
+
+
+def test_expired_is_missing(ddb):
+    cache = dynamo.DDBCache({}, ddb)
+    cache.put_many({"old": 1}, ttl=-1)
+    cache.put("new", 2, ttl=100)
+    reader = dynamo.DDBCache({}, ddb)
+    assert reader.get("old") is None
+    assert reader.get_many(["old", "new"]) == {"old": None, "new": 2}
+    assert reader.prune() == 1
+
+
+def test_put_many_only_if_changed(ddb):
+    cache = dynamo.DDBCache({}, ddb)
+    assert cache.put_many({"a": 1, "b": 2}, only_if_changed=True) == 2
+    assert cache.put_many({"a": 1, "b": 3}, only_if_changed=True) == 1
+    assert cache.put_many({"a": 1, "b": 3}) == 2
+    # Adding an expiry is a change.
+    assert cache.put_many({"a": 1}, ttl=100, only_if_changed=True) == 1
+    assert cache.put_many({"a": 1}, ttl=100, only_if_changed=True) == 0
+    assert cache.get_many(["a", "b"]) == {"a": 1, "b": 3}
@@ -0,0 +1,56 @@
+from unittest import mock
+
+import dynamo
+import report_drupal
+
+WEB_USERS = {
+    "u1": {"name": "Ann Smith", "mail": "ann@x.org", "drupal_internal__uid": 5},
+    "u2": {"name": "Bob Jones", "mail": "bob@x.org", "drupal_internal__uid": 6},
+}
+
+SLACK_USERS = [
+    # Email and name match
+    {"id": "S1", "profile": {"real_name": "A S", "email": "Ann@x.org"}},
+    # No email - name would match but mustn't
+    {
+        "id": "S2",
+        "profile": {"real_name": "Bob Jones", "real_name_normalized": "Bob Jones"},
+    },
+    # Email doesn't match but name does
+    {
+        "id": "S3",
+        "profile": {
+            "real_name": "Ann Smith",
+            "real_name_normalized": "Ann Smith",
+            "email": "other@y.org",
+        },
+    },
+]
+
+
+class _Users:
+    def get_all_users(self):
+        return WEB_USERS
+
+
+def _users_info(endpoint, params=None):
+    return {"user": next(su for su in SLACK_USERS if su["id"] == params["user"])}
+
+
+def _report(ddb):
+    return report_drupal.Report({}, None, _Users(), dynamo.DDBCache({}, ddb))
+
+
+def test_primed_and_miss_agree(ddb):
+    with mock.patch.object(
+        report_drupal.slack_api, "get_all_users", return_value=SLACK_USERS
+    ), mock.patch.object(report_drupal.slack_api, "get", side_effect=_users_info):
+        primed = _report(ddb)
+        primed.prime_identities()
+        for su in SLACK_USERS:
+            live = _report(ddb)._slack2plsnr(su["id"])
+            assert primed.slack2plsnr(su["id"]) == live
+
+    assert primed.slack2plsnr("S1") == ("u1", "Ann Smith", 5)
+    assert primed.slack2plsnr("S2") == (None, None, None)
+    assert primed.slack2plsnr("S3") == ("u1", "Ann Smith", 5)
@@ -0,0 +1,92 @@
+from dateutil import parser as date_parser
+
+from scheduled_activity import ScheduledActivity
+
+TYPES = {
+    "info": {
+        "name": "Info Station",
+        "custom_fields": [{"options": None}, {"options": None}],
+    }
+}
+
+
+def _activity(sid, start):
+    return {
+        "attributes": {
+            "drupal_internal__id": sid,
+            "activity_type": "info",
+            "start_time": start,
+            "end_time": None,
+            "title": f"T{sid}",
+            "custom1": None,
+            "custom2": None,
+        },
+        "relationships": {"presenter": {"data": {"id": f"u{sid}"}}},
+    }
+
+
+# DST ends 2024-11-03 02:00 PDT (UTC-7) -> 01:00 PST (UTC-8)
+ACTIVITIES = [
+    _activity(1, "2024-11-02T06:59:00+00:00"),  # 11-01 23:59 PDT
+    _activity(2, "2024-11-03T06:30:00+00:00"),  # 11-02 23:30 PDT
+    _activity(3, "2024-11-03T07:30:00+00:00"),  # 11-03 00:30 PDT
+    _activity(4, "2024-11-04T07:30:00+00:00"),  # 11-03 23:30 PST
+    _activity(5, "2024-11-04T08:30:00+00:00"),  # 11-04 00:30 PST
+]
+
+
+class StubSite:
+    def __init__(self):
+        self.params = []
+
+    def get_activity_views(self):
+        return {}
+
+    def get_activity_types(self):
+        return TYPES
+
+    def simple_get(self, path, params, fetchall=True, parallel=False):
+        self.params.append(params)
+        start = date_parser.parse(params["filter[from][condition][value]"])
+        end = date_parser.parse(params["filter[to][condition][value]"])
+        return [
+            a
+            for a in ACTIVITIES
+            if start <= date_parser.parse(a["attributes"]["start_time"]) < end
+        ]
+
+    def get_in(self, path, field, values, params=None, chunk_size=50, max_workers=None):
+        return []
+
+    def get_users(self, uuids, fields=None, chunk_size=50):
+        return {uuid: {"name": uuid.upper()} for uuid in uuids}
+
+
+def _who(atinfo):
+    return sorted(
+        who for entries in atinfo.values() for e in entries for who in e["who"]
+    )
+
+
+def test_whoat_range_dst_day_bounds():
+    site = StubSite()
+    rv = ScheduledActivity({}, site).whoat_range("20241103", 1, "all")
+
+    params = site.params[-1]
+    assert params["filter[from][condition][value]"] == "2024-11-03T07:00:00+00:00"
+    assert params["filter[to][condition][value]"] == "2024-11-04T08:00:00+00:00"
+    assert list(rv) == ["20241103"]
+    assert _who(rv["20241103"]) == ["U3", "U4"]
+
+
+def test_whoat_range_dst_split():
+    site = StubSite()
+    rv = ScheduledActivity({}, site).whoat_range("20241102", 3, "all")
+
+    params = site.params[-1]
+    assert params["filter[from][condition][value]"] == "2024-11-02T07:00:00+00:00"
+    assert params["filter[to][condition][value]"] == "2024-11-05T08:00:00+00:00"
+    assert list(rv) == ["20241102", "20241103", "20241104"]
+    assert _who(rv["20241102"]) == ["U2"]
+    assert _who(rv["20241103"]) == ["U3", "U4"]
+    assert _who(rv["20241104"]) == ["U5"]
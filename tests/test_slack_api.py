@@ -0,0 +1,24 @@
+import pytest
+import requests
+from requests_mock import ANY
+
+from exc import SlackApiError
+import slack_api
+
+
+@pytest.fixture(autouse=True)
+def tokens(monkeypatch):
+    monkeypatch.setenv("BOT_TOKEN", "xoxb-test")
+
+
+def test_post_timeout_raises(requests_mock, caplog):
+    requests_mock.post(ANY, exc=requests.exceptions.ConnectTimeout)
+    with pytest.raises(SlackApiError):
+        slack_api.post_ephemeral_message("C1", "U1", "hi")
+    assert "POST to chat.postEphemeral failed" in caplog.text
+
+
+def test_post_error_raises(requests_mock):
+    requests_mock.post(ANY, json={"ok": False, "error": "bad"})
+    with pytest.raises(SlackApiError):
+        slack_api.post("views.open", {})